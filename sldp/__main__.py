@@ -0,0 +1,6 @@
+import sys
+
+from sldp.cli import main
+
+
+sys.exit(main())
@@ -0,0 +1,207 @@
+import itertools
+from typing import Iterable, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as fs
+import pyarrow.parquet as pq
+
+from sldp.poses.load_openpose import Pose
+from sldp.webdatasets.stats import compute_frame_stats
+
+
+METADATA_SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("label", pa.string()),
+    ("label_id", pa.int32()),
+    ("signer_id", pa.string()),
+    ("n_frames", pa.int32()),
+    ("missing_fraction", pa.float32()),
+    ("multiple_fraction", pa.float32()),
+    ("video_width", pa.float32()),
+    ("video_height", pa.float32()),
+    ("video_fps", pa.float32()),
+])
+
+
+def _as_sample_dict(sample: dict | Pose) -> dict:
+    if isinstance(sample, Pose):
+        return {"id": sample.id, "poses": sample.poses, "frame_statuses": sample.frame_statuses}
+    return sample
+
+
+def _get_pose_type(pose: np.ndarray, value_type: pa.DataType) -> pa.DataType:
+    _, n_landmarks, n_coords = pose.shape
+    return pa.list_(pa.list_(pa.list_(value_type, n_coords), n_landmarks))
+
+
+def get_pose_schema(sample: dict | Pose, dtype="float32") -> pa.Schema:
+    """
+    Returns the schema of the table of a pose dataset: the metadata columns, and one column
+    per body region of type `list<fixed_size_list<fixed_size_list<float, C>, L>>` (frames, landmarks, coordinates).
+    """
+    value_type = pa.from_numpy_dtype(np.dtype(dtype))
+    sample = _as_sample_dict(sample)
+    pose_fields = [
+        pa.field(f"pose_{region}", _get_pose_type(pose, value_type))
+        for region, pose in sample["poses"].items()
+    ]
+    return pa.schema(list(METADATA_SCHEMA) + pose_fields)
+
+
+def _pose_column(poses: list[np.ndarray], pose_type: pa.DataType) -> pa.Array:
+    n_coords = pose_type.value_type.value_type.list_size
+    n_landmarks = pose_type.value_type.list_size
+    value_type = pose_type.value_type.value_type.value_type
+    for pose in poses:
+        if pose.shape[1:] != (n_landmarks, n_coords):
+            raise ValueError(f"Expected poses of shape (T, {n_landmarks}, {n_coords}), got {pose.shape}.")
+    values = np.concatenate(poses, axis=0).astype(value_type.to_pandas_dtype(), copy=False).ravel()
+    offsets = np.zeros(len(poses) + 1, dtype="int32")
+    np.cumsum([pose.shape[0] for pose in poses], out=offsets[1:])
+    coords = pa.FixedSizeListArray.from_arrays(pa.array(values, type=value_type), n_coords)
+    landmarks = pa.FixedSizeListArray.from_arrays(coords, n_landmarks)
+    return pa.ListArray.from_arrays(pa.array(offsets), landmarks)
+
+
+def samples_to_record_batch(samples: list[dict | Pose], schema: pa.Schema) -> pa.RecordBatch:
+    """
+    Converts samples (from the loaders, the shard reader, or `read_open_pose_tar`) into a record batch.
+    """
+    samples = [_as_sample_dict(sample) for sample in samples]
+    columns = {field.name: [] for field in METADATA_SCHEMA}
+    for sample in samples:
+        metadata = sample.get("metadata", {})
+        n_frames, missing_fraction, multiple_fraction = compute_frame_stats(sample["poses"], sample.get("frame_statuses"))
+        columns["id"].append(sample["id"])
+        columns["label"].append(sample.get("label"))
+        columns["label_id"].append(sample.get("label_id"))
+        columns["signer_id"].append(sample.get("signer_id", metadata.get("signer_id")))
+        columns["n_frames"].append(n_frames)
+        columns["missing_fraction"].append(missing_fraction)
+        columns["multiple_fraction"].append(multiple_fraction)
+        for key in ("video_width", "video_height", "video_fps"):
+            columns[key].append(metadata.get(key))
+    arrays = [pa.array(columns[field.name], type=field.type) for field in METADATA_SCHEMA]
+    for field in schema:
+        if field.name.startswith("pose_"):
+            region = field.name[len("pose_"):]
+            arrays.append(_pose_column([sample["poses"][region] for sample in samples], field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _iter_record_batches(samples: Iterable[dict | Pose], batch_size: int, dtype):
+    samples = iter(samples)
+    schema = None
+    while batch := list(itertools.islice(samples, batch_size)):
+        if schema is None:
+            schema = get_pose_schema(batch[0], dtype=dtype)
+        yield samples_to_record_batch(batch, schema)
+
+
+def export_poses_to_parquet(
+    samples: Iterable[dict | Pose],
+    dest_filepath: str,
+    row_group_size: int = 512,
+    compression: str = "zstd",
+    dtype="float32",
+):
+    """
+    Exports pose samples to a Parquet file, with metadata columns (id, label, signer, number of frames,
+    missing frames, ...) and one nested column per body region (see `get_pose_schema`).
+
+    Each row group contains `row_group_size` samples, and has statistics on the metadata columns,
+    so that filtered reads (see `read_pose_table`) skip row groups and only decode the selected columns.
+
+    Args:
+        samples: Samples from the loaders, the shard reader, or `read_open_pose_tar`.
+        dest_filepath: Path of the Parquet file.
+        row_group_size: Number of samples per row group. Default to 512.
+        compression: Parquet compression codec. Default to zstd.
+        dtype: Data type of the coordinates. Default to float32.
+    """
+    writer = None
+    try:
+        for batch in _iter_record_batches(samples, row_group_size, dtype):
+            if writer is None:
+                writer = pq.ParquetWriter(dest_filepath, batch.schema, compression=compression)
+            writer.write_batch(batch, row_group_size=row_group_size)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def export_poses_to_arrow_ipc(
+    samples: Iterable[dict | Pose],
+    dest_filepath: str,
+    batch_size: int = 512,
+    dtype="float32",
+):
+    """
+    Exports pose samples to an (uncompressed) Arrow IPC file, that can be memory-mapped.
+    The table has the same schema as with `export_poses_to_parquet`.
+    """
+    writer = None
+    try:
+        for batch in _iter_record_batches(samples, batch_size, dtype):
+            if writer is None:
+                writer = pa.ipc.new_file(dest_filepath, batch.schema)
+            writer.write_batch(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def read_pose_table(
+    filepath: str,
+    columns: Optional[list[str]] = None,
+    filter: Optional[ds.Expression] = None,
+) -> pa.Table:
+    """
+    Reads a pose table exported with `export_poses_to_parquet` or `export_poses_to_arrow_ipc`,
+    with column pruning and predicate pushdown. Arrow IPC files are memory-mapped.
+
+    Example:
+        >>> read_pose_table(
+        ...     "wlasl.parquet",
+        ...     columns=["id", "label", "pose_left_hand"],
+        ...     filter=(ds.field("n_frames") >= 32) & (ds.field("missing_fraction") < 0.1),
+        ... )
+
+    Args:
+        filepath: Path of the Parquet (`.parquet`) or Arrow IPC file.
+        columns: Columns to read. Default to None (all columns).
+        filter: Filter expression on the columns. Default to None.
+    """
+    if filepath.endswith(".parquet"):
+        dataset = ds.dataset(filepath, format="parquet")
+    else:
+        dataset = ds.dataset(filepath, format="ipc", filesystem=fs.LocalFileSystem(use_mmap=True))
+    return dataset.to_table(columns=columns, filter=filter)
+
+
+def pose_column_to_numpy(table: pa.Table, region: str) -> list[np.ndarray]:
+    """
+    Converts the pose column of a body region into one array of shape (T, L, C) per row,
+    without copying the values.
+    """
+    poses = []
+    for chunk in table.column(f"pose_{region}").chunks:
+        n_landmarks = chunk.type.value_type.list_size
+        n_coords = chunk.type.value_type.value_type.list_size
+        offsets = chunk.offsets.to_numpy()
+        offsets = offsets - offsets[0]
+        values = chunk.flatten().flatten().flatten().to_numpy(zero_copy_only=False)
+        frames = values.reshape(-1, n_landmarks, n_coords)
+        poses += [frames[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+    return poses
+
+
+if __name__ == "__main__":
+    from sldp.csv.wlasl_format import read_wlasl_format_csv
+
+    export_poses_to_parquet(
+        read_wlasl_format_csv("E:/datasets/sign-language/wlasl/spoter/WLASL100_train_25fps.csv"),
+        "E:/datasets/sign-language/wlasl/parquet/asl100_train.parquet",
+    )
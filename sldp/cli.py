@@ -0,0 +1,129 @@
+import argparse
+import os
+import sys
+import time
+import tomllib
+from typing import Any, Optional
+
+import orjson
+
+from sldp.utils.dag import StageSpec, format_timings, resolve_dependencies, run_dag
+
+
+def _format_values(value: Any, variables: dict[str, str]) -> Any:
+    if isinstance(value, str):
+        return value.format(**variables)
+    if isinstance(value, list):
+        return [_format_values(item, variables) for item in value]
+    if isinstance(value, dict):
+        return {key: _format_values(item, variables) for key, item in value.items()}
+    return value
+
+
+def load_pipeline_config(config_path: str) -> tuple[list[StageSpec], dict[str, Any]]:
+    """
+    Loads a pipeline from a TOML file.
+
+    Example:
+        [budget]
+        cpu = 16
+        io = 4
+
+        [vars]
+        root = "/data/dgs-corpus"
+
+        [stages.dgs_index]
+        function = "sldp.datasets.dgs.create_index:create_dgs_annotated_samples_index"
+        kwargs = { dest_filepath = "{root}/index.csv" }
+        outputs = ["{root}/index.csv"]
+        io = 1
+
+    Strings of the stages are formatted with the variables of the `[vars]` table.
+
+    Returns:
+        The stages, and the budget.
+    """
+    with open(config_path, "rb") as f:
+        config = tomllib.load(f)
+    variables = config.get("vars", {})
+    stages = []
+    for name, stage_config in config.get("stages", {}).items():
+        stage_config = _format_values(stage_config, variables)
+        stages.append(StageSpec(name=name, **stage_config))
+    return stages, config.get("budget", {})
+
+
+def _select_stages(stages: list[StageSpec], names: Optional[list[str]]) -> list[StageSpec]:
+    """Selects the given stages and all the stages they depend on."""
+    if not names:
+        return stages
+    dependencies = resolve_dependencies(stages)
+    unknown = set(names) - set(dependencies)
+    if unknown:
+        raise ValueError(f"Unknown stages: {sorted(unknown)}.")
+    selected, to_visit = set(), list(names)
+    while to_visit:
+        name = to_visit.pop()
+        if name not in selected:
+            selected.add(name)
+            to_visit.extend(dependencies[name])
+    return [stage for stage in stages if stage.name in selected]
+
+
+def _run(args: argparse.Namespace) -> int:
+    stages, budget = load_pipeline_config(args.config)
+    stages = _select_stages(stages, args.stages)
+    started_at = time.perf_counter()
+    timings = run_dag(
+        stages,
+        max_cpu=args.max_cpu or budget.get("cpu", os.cpu_count() or 1),
+        max_io=args.max_io or budget.get("io", 4),
+        skip_completed=not args.force,
+        state_dir=args.state_dir,
+    )
+    print(format_timings(timings))
+    print(f"Total: {time.perf_counter() - started_at:.1f}s")
+    if args.timings:
+        with open(args.timings, "wb") as f:
+            f.write(orjson.dumps(
+                {name: timing.__dict__ for name, timing in timings.items()},
+                option=orjson.OPT_INDENT_2,
+            ))
+    return 0 if all(timing.status in ("done", "skipped") for timing in timings.values()) else 1
+
+
+def _list(args: argparse.Namespace) -> int:
+    stages, _ = load_pipeline_config(args.config)
+    dependencies = resolve_dependencies(stages)
+    for stage in stages:
+        depends_on = ", ".join(sorted(dependencies[stage.name])) or "-"
+        print(f"{stage.name:<32} cpu={stage.cpu:<3} io={stage.io:<3} after: {depends_on}")
+    return 0
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="sldp", description="Sign language data preparation pipelines.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the stages of a pipeline.")
+    run_parser.add_argument("config", help="Path of the pipeline configuration (TOML).")
+    run_parser.add_argument("stages", nargs="*", help="Stages to run, with their dependencies. Default to all.")
+    run_parser.add_argument("--max-cpu", type=int, default=None, help="Number of CPU slots.")
+    run_parser.add_argument("--max-io", type=int, default=None, help="Number of I/O slots.")
+    run_parser.add_argument("--force", action="store_true", help="Also run the stages that already completed.")
+    run_parser.add_argument(
+        "--state-dir", default=".sldp", help="Directory of the completion stamps of the stages. Default to .sldp."
+    )
+    run_parser.add_argument("--timings", default=None, help="Write the stage timings to this JSON file.")
+    run_parser.set_defaults(handler=_run)
+
+    list_parser = subparsers.add_parser("list", help="List the stages of a pipeline.")
+    list_parser.add_argument("config", help="Path of the pipeline configuration (TOML).")
+    list_parser.set_defaults(handler=_list)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+import os
+from pathlib import Path
+
+import numpy as np
+import orjson
+
+from sldp.utils.parallel import run_parallel
+from sldp.webdatasets.simple_islr import build_simple_islr_webdataset
+
+
+def intervals_to_frames(
+    start_ms: np.ndarray,
+    end_ms: np.ndarray,
+    fps: float,
+    n_frames: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Converts time intervals (in milliseconds) into frame intervals `[start, end)`, clipped to the recording.
+    Every non-empty interval contains at least one frame.
+    """
+    start_frames = np.floor(np.asarray(start_ms, dtype="float64") * fps / 1000).astype("int64")
+    end_frames = np.ceil(np.asarray(end_ms, dtype="float64") * fps / 1000).astype("int64")
+    end_frames = np.maximum(end_frames, start_frames + 1)
+    return np.clip(start_frames, 0, n_frames), np.clip(end_frames, 0, n_frames)
+
+
+def extract_clips_from_recording(
+    recording_id: str,
+    glosses: list[dict],
+    poses_dir: str,
+    dest_filepath: str,
+    label_mapping: dict[str, int],
+    gloss_column: str = "gloss_en",
+    fps: float = 50,
+    body_regions=("pose", "left_hand", "right_hand", "face"),
+):
+    """
+    Extracts the clips of all the glosses of a recording and writes them into one ISLR shard.
+
+    The poses of the recording are loaded once (memory-mapped), and each clip is a view on them.
+
+    Args:
+        recording_id: Id of the recording (`{sample_id}_{letter}`).
+        glosses: Glosses of the recording, with `start_ms`, `end_ms` and the gloss column.
+        poses_dir: Directory containing the poses of the recordings (`{region}/{recording_id}.npy`).
+        dest_filepath: Path of the produced shard.
+        label_mapping: Mapping from gloss to label id.
+        gloss_column: Column containing the gloss. Default to "gloss_en".
+        fps: Frame rate of the poses. Default to 50 (DGS Corpus).
+        body_regions: Body regions to include in the clips.
+    """
+    poses = {
+        region: np.load(Path(poses_dir) / region / f"{recording_id}.npy", mmap_mode="r")
+        for region in body_regions
+    }
+    n_frames = next(iter(poses.values())).shape[0]
+    start_frames, end_frames = intervals_to_frames(
+        [gloss["start_ms"] for gloss in glosses],
+        [gloss["end_ms"] for gloss in glosses],
+        fps=fps,
+        n_frames=n_frames,
+    )
+    samples = []
+    for idx, (gloss, start, end) in enumerate(zip(glosses, start_frames, end_frames)):
+        if start >= end or gloss[gloss_column] is None:
+            continue
+        samples.append({
+            'id': f"{recording_id}_{idx:0>5}",
+            'poses': {region: region_poses[start:end] for region, region_poses in poses.items()},
+            'label_id': label_mapping[gloss[gloss_column]],
+            'label': gloss[gloss_column],
+        })
+    Path(dest_filepath).parent.mkdir(parents=True, exist_ok=True)
+    build_simple_islr_webdataset(samples, dest_filepath)
+
+
+def extract_dgs_clips(
+    root: str,
+    hand: str = "right_hand",
+    gloss_column: str = "gloss_en",
+    fps: float = 50,
+    body_regions=("pose", "left_hand", "right_hand", "face"),
+    n_jobs: int = 8,
+):
+    """
+    Extracts isolated sign clips from the continuous DGS Corpus poses, using the glosses of
+    `{root}/annotations/json/{hand}_all_glosses.json` and the poses of `{root}/poses/npy`
+    (see `sldp.datasets.dgs.poses`). Recordings are processed in parallel, and each one
+    produces a shard `{root}/shards/{hand}/{recording_id}.tar`.
+
+    The label mapping (gloss -> label id) is saved in `{root}/annotations/json/{hand}_label_mapping.json`.
+    """
+    with open(f"{root}/annotations/json/{hand}_all_glosses.json", "rb") as f:
+        all_glosses = orjson.loads(f.read())
+    glosses = sorted({
+        gloss[gloss_column]
+        for recording_glosses in all_glosses.values()
+        for gloss in recording_glosses
+        if gloss[gloss_column] is not None
+    })
+    label_mapping = {gloss: label_id for label_id, gloss in enumerate(glosses)}
+    with open(f"{root}/annotations/json/{hand}_label_mapping.json", "wb") as f:
+        f.write(orjson.dumps(label_mapping, option=orjson.OPT_INDENT_2))
+
+    commands = []
+    for recording_id, recording_glosses in all_glosses.items():
+        if not os.path.exists(f"{root}/poses/npy/{body_regions[0]}/{recording_id}.npy"):
+            print(f"Missing poses for recording {recording_id}.")
+            continue
+        commands.append(dict(
+            recording_id=recording_id,
+            glosses=recording_glosses,
+            poses_dir=f"{root}/poses/npy",
+            dest_filepath=f"{root}/shards/{hand}/{recording_id}.tar",
+            label_mapping=label_mapping,
+            gloss_column=gloss_column,
+            fps=fps,
+            body_regions=body_regions,
+        ))
+    run_parallel(extract_clips_from_recording, commands, n_jobs=n_jobs)
+
+
+if __name__ == '__main__':
+    extract_dgs_clips("E:/datasets/sign-language/dgs-corpus")
@@ -18,7 +18,7 @@ def create_annotations_from_eaf_files(root: str):
             print(f"Failed to extract annotations from {sample_id}: {err}")
             continue
         for letter, hand in itertools.product(annots, ('left_hand', 'right_hand')):
-            if (letter in all_annots) and (hand in annots[letter]):
+            if hand in annots[letter]:
                 all_annots[hand][f"{sample_id}_{letter}"] = annots[letter][hand]
     os.makedirs(f"{root}/annotations/json", exist_ok=True)
     for hand in ('left_hand', 'right_hand'):
@@ -1,6 +1,7 @@
 import pandas as pd
 import asyncio
 
+from sldp.poses.extract_poses import download_and_extract_poses
 from sldp.utils.download import download_files
 
 
@@ -19,10 +20,53 @@ def _create_file_list(root: str, index: pd.DataFrame):
     return files_to_download
 
 
+def _check_results(results: list[tuple[str, bool]]):
+    failed = [filepath for filepath, success in results if not success]
+    if failed:
+        raise RuntimeError(f"{len(failed)} / {len(results)} files failed: {failed[:10]}")
+
+
 async def download_dgs_dataset(index_filepath: str, dest_dir: str):
+    """
+    Downloads the videos, the EAF annotations and the OpenPose files of the DGS Corpus into `dest_dir`.
+
+    Raises:
+        RuntimeError: If any file could not be downloaded (existing files are skipped on the next run).
+    """
+    index = pd.read_csv(index_filepath)
+    files_to_download = _create_file_list(dest_dir, index)
+    _check_results(await download_files(files_to_download, verbose=True, skip_existing=True))
+
+
+async def download_and_extract_dgs_poses(
+        index_filepath: str,
+        dest_dir: str,
+        model_path: str,
+        n_jobs: int = 8,
+        max_pending_videos: int = 16,
+        delete_videos: bool = False,
+):
+    """
+    Downloads the DGS Corpus and extracts the poses of each video as soon as it is downloaded,
+    into `{dest_dir}/poses/mediapipe` with the holistic landmarker model at `model_path`
+    (see `download_and_extract_poses`).
+
+    Raises:
+        RuntimeError: If any file could not be downloaded, or any video could not be extracted.
+    """
     index = pd.read_csv(index_filepath)
     files_to_download = _create_file_list(dest_dir, index)
-    await download_files(files_to_download, verbose=True, skip_existing=True)
+    results = await download_and_extract_poses(
+        files_to_download,
+        dest_poses_dir=f"{dest_dir}/poses/mediapipe",
+        model_path=model_path,
+        n_jobs=n_jobs,
+        max_pending_videos=max_pending_videos,
+        delete_videos=delete_videos,
+        verbose=True,
+        skip_existing=True,
+    )
+    _check_results(results)
 
 
 if __name__ == '__main__':
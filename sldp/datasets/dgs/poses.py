@@ -0,0 +1,64 @@
+import gzip
+import os
+from pathlib import Path
+
+import numpy as np
+import orjson
+
+from sldp.poses.load_openpose import _get_empty_pose, read_open_pose_frame
+from sldp.utils.parallel import run_parallel
+
+
+def convert_dgs_open_pose_file(
+    src_filepath: str,
+    dest_poses_dir: str,
+    sample_id: str,
+    body_regions=("pose", "left_hand", "right_hand", "face"),
+    n_coords=3,
+):
+    """
+    Converts a DGS Corpus OpenPose file (`.json.gz`, one entry per camera) into one numpy array
+    per body region and signer, saved in `{dest_poses_dir}/{region}/{sample_id}_{letter}.npy`.
+    Frames without annotations are filled with NaN.
+    """
+    with gzip.open(src_filepath, "rb") as f:
+        cameras = orjson.loads(f.read())
+    for camera in cameras:
+        letter = camera["camera"][0]
+        if letter not in ("a", "b"):
+            continue
+        frames = {int(frame_nb): frame for frame_nb, frame in camera["frames"].items()}
+        n_frames = max(frames) + 1 if frames else 0
+        poses = {
+            region: np.empty((n_frames, *empty_pose.shape), dtype="float16")
+            for region, empty_pose in _get_empty_pose(body_regions, n_coords).items()
+        }
+        for frame_nb in range(n_frames):
+            if frame_nb in frames:
+                frame_poses, _ = read_open_pose_frame(frames[frame_nb], body_regions=body_regions, n_coords=n_coords)
+            else:
+                frame_poses = _get_empty_pose(body_regions, n_coords)
+            for region, pose in frame_poses.items():
+                poses[region][frame_nb] = pose
+        for region, region_poses in poses.items():
+            pose_path = Path(dest_poses_dir) / region / f"{sample_id}_{letter}.npy"
+            pose_path.parent.mkdir(parents=True, exist_ok=True)
+            np.save(pose_path, region_poses)
+
+
+def convert_dgs_open_pose_files(root: str, n_jobs: int = 8, **kwargs):
+    commands = []
+    for entry in os.scandir(f"{root}/poses/openpose"):
+        if not entry.is_file() or not entry.name.endswith(".json.gz"):
+            continue
+        commands.append(dict(
+            src_filepath=entry.path,
+            dest_poses_dir=f"{root}/poses/npy",
+            sample_id=entry.name[:-len(".json.gz")],
+            **kwargs,
+        ))
+    run_parallel(convert_dgs_open_pose_file, commands, n_jobs=n_jobs)
+
+
+if __name__ == '__main__':
+    convert_dgs_open_pose_files("E:/datasets/sign-language/dgs-corpus")
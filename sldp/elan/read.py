@@ -2,13 +2,14 @@ import itertools
 from typing import Optional
 
 import pandas as pd
-from pympi import Eaf
 
 
 def extract_annotations_from_elan(
     elan_path: str,
     columns: Optional[tuple[str, ...]] = None,
 ):
+    from pympi import Eaf
+
     eaf = Eaf(elan_path)
     if len(eaf.tiers) < 1:
         raise ValueError(f"Empty ELAN file.")
@@ -0,0 +1,79 @@
+import io
+from typing import Optional
+
+import numpy as np
+
+from sldp.poses.quantize import QuantizedPose, encode_quantized_pose, quantized_pose_from_bytes, quantized_pose_to_bytes
+from sldp.poses.sparse import SparsePose, encode_sparse_pose, sparse_pose_from_bytes, sparse_pose_to_bytes
+
+
+# Extension of the shard members of each pose codec.
+POSE_CODEC_EXTENSIONS = {
+    "npy": "npy",
+    "sparse": "sparse.npz",
+    "quantized": "q16.npz",
+}
+
+
+def serialize_pose(pose: np.ndarray, codec: str = "npy", **codec_options) -> tuple[str, bytes]:
+    """
+    Serializes a pose array of shape (T, L, C) for a shard.
+
+    Codecs:
+      - `npy`: dense `.npy` array;
+      - `sparse`: sparse layout of `sldp.poses.sparse` (options: `confidence_threshold`, `compress`);
+      - `quantized`: int16 fixed point of `sldp.poses.quantize`, compressed (options: `delta`, `frame_size`, `compress`).
+
+    Returns:
+        The extension of the member (e.g. `npy` for `{key}.pose.{region}.npy`), and the serialized pose.
+    """
+    match codec:
+        case "npy":
+            buffer = io.BytesIO()
+            np.save(buffer, pose, allow_pickle=False)
+            data = buffer.getvalue()
+        case "sparse":
+            confidence_threshold = codec_options.get("confidence_threshold")
+            sparse_pose = encode_sparse_pose(pose, confidence_threshold=confidence_threshold)
+            data = sparse_pose_to_bytes(sparse_pose, compress=codec_options.get("compress", False))
+        case "quantized":
+            quantized_pose = encode_quantized_pose(
+                pose,
+                delta=codec_options.get("delta", True),
+                frame_size=codec_options.get("frame_size"),
+            )
+            data = quantized_pose_to_bytes(quantized_pose, compress=codec_options.get("compress", True))
+        case _:
+            raise ValueError(f"Unknown pose codec: [{codec}].")
+    return POSE_CODEC_EXTENSIONS[codec], data
+
+
+def get_pose_codec(extension: str) -> Optional[str]:
+    """Returns the codec of a shard member from its extension, or None if it is not an encoded pose."""
+    for codec, codec_extension in POSE_CODEC_EXTENSIONS.items():
+        if extension == codec_extension or extension.endswith(f".{codec_extension}"):
+            return codec
+    return None
+
+
+def deserialize_pose(data: bytes, codec: str, densify: bool = True) -> np.ndarray | SparsePose | QuantizedPose:
+    """
+    Deserializes a pose serialized with `serialize_pose`.
+
+    Args:
+        data: Serialized pose.
+        codec: Codec of the pose.
+        densify: Rebuild the dense (T, L, C) array. Otherwise, sparse and quantized poses are returned
+            as `SparsePose` and `QuantizedPose`. Default to True.
+    """
+    match codec:
+        case "npy":
+            return np.load(io.BytesIO(data), allow_pickle=False)
+        case "sparse":
+            sparse_pose = sparse_pose_from_bytes(data)
+            return sparse_pose.to_dense() if densify else sparse_pose
+        case "quantized":
+            quantized_pose = quantized_pose_from_bytes(data)
+            return quantized_pose.to_dense() if densify else quantized_pose
+        case _:
+            raise ValueError(f"Unknown pose codec: [{codec}].")
@@ -1,8 +1,106 @@
-import io
+import functools
 import tarfile
+from typing import Optional
 
-from load_openpose import read_open_pose_tar
+from sldp.poses.codecs import serialize_pose
+from sldp.poses.load_openpose import Pose, decode_open_pose_sample, iter_raw_open_pose_samples
+from sldp.utils.pipeline import Stage, run_pipeline
 from sldp.utils.tar import add_file_to_tar
+from sldp.webdatasets.stats import ShardStatsWriter, compute_frame_stats, get_stats_path
+
+
+class _TarChunkWriter:
+    """
+    Writes members into a sequence of tar files, starting a new one
+    each time the current tar file exceeds the maximum chunk size.
+    A statistics sidecar is written next to each tar file (see `sldp.webdatasets.stats`).
+    """
+
+    def __init__(self, dest_tar_path_template: str, max_chunk_size: Optional[int] = None):
+        self.dest_tar_path_template = dest_tar_path_template
+        self.max_chunk_size = max_chunk_size
+        self.chunk_number = 0
+        self.output_path = None
+        self.dest_file = None
+        self.dest_tar = None
+        self.stats = None
+        self._open_next_chunk()
+
+    def _open_next_chunk(self):
+        self.chunk_number += 1
+        self.output_path = self.dest_tar_path_template.format(self.chunk_number)
+        self.dest_file = open(self.output_path, "wb")
+        self.dest_tar = tarfile.open(fileobj=self.dest_file, mode="w")
+        self.stats = ShardStatsWriter()
+
+    def _close_chunk(self):
+        self.dest_tar.close()
+        self.dest_file.close()
+        self.stats.save(get_stats_path(self.output_path))
+
+    def write(self, serialized_sample: tuple[Pose, list[tuple[str, bytes]]]):
+        sample, members = serialized_sample
+        start_offset = self.dest_file.tell()
+        for name, data in members:
+            add_file_to_tar(name, self.dest_tar, data)
+        n_frames, missing_fraction, multiple_fraction = compute_frame_stats(sample.poses, sample.frame_statuses)
+        self.stats.add(
+            sample.id,
+            n_frames=n_frames,
+            missing_fraction=missing_fraction,
+            multiple_fraction=multiple_fraction,
+            n_bytes=self.dest_file.tell() - start_offset,
+        )
+        if self.max_chunk_size is not None and self.dest_file.tell() >= self.max_chunk_size:
+            self._close_chunk()
+            self._open_next_chunk()
+
+    def close(self):
+        self._close_chunk()
+
+
+def _serialize_pose(sample: Pose, codec: str, codec_options: dict) -> tuple[Pose, list[tuple[str, bytes]]]:
+    members = []
+    for region, pose in sample.poses.items():
+        extension, data = serialize_pose(pose, codec, **codec_options)
+        members.append((f"poses/{region}/{sample.id}.{extension}", data))
+    return sample, members
+
+
+def _decode_raw_sample(raw_sample: tuple[str, dict[int, bytes]], body_regions, n_coords) -> Pose:
+    sample_id, raw_frames = raw_sample
+    return decode_open_pose_sample(sample_id, raw_frames, body_regions=body_regions, n_coords=n_coords)
+
+
+def _run_conversion(
+    source_tar_path: str,
+    writer: _TarChunkWriter,
+    show_progress: bool,
+    body_regions: tuple[str, ...],
+    n_coords: int,
+    sub_tars: bool,
+    n_decode_workers: int,
+    n_serialize_workers: int,
+    queue_size: int,
+    codec: str,
+    codec_options: Optional[dict],
+):
+    decode = functools.partial(
+        _decode_raw_sample, body_regions=body_regions, n_coords=n_coords
+    )
+    serialize = functools.partial(_serialize_pose, codec=codec, codec_options=codec_options or {})
+    try:
+        run_pipeline(
+            iter_raw_open_pose_samples(source_tar_path, show_progress=show_progress, sub_tars=sub_tars),
+            stages=[
+                # JSON decoding holds the GIL: it runs in worker processes, fed with the raw frames.
+                Stage("decode", decode, n_workers=n_decode_workers, queue_size=queue_size, executor="process"),
+                Stage("serialize", serialize, n_workers=n_serialize_workers, queue_size=queue_size),
+            ],
+            sink=writer.write,
+        )
+    finally:
+        writer.close()
 
 
 def convert_open_pose_tar(
@@ -11,23 +109,49 @@ def convert_open_pose_tar(
     show_progress=False,
     body_regions=("pose", "left_hand", "right_hand"),
     n_coords=3,
+    n_decode_workers=4,
+    n_serialize_workers=1,
+    queue_size=2,
+    codec="npy",
+    codec_options=None,
 ):
-    dest_buffer = io.BytesIO()
-    dest_tar = tarfile.open(fileobj=dest_buffer, mode="w")
+    """
+    Converts an OpenPose tar archive into a tar archive of numpy arrays.
 
-    for sample in read_open_pose_tar(
+    Reading the source archive, decoding the frames and writing the destination archive
+    run as separate pipeline stages connected by bounded queues (see `sldp.utils.pipeline`).
+
+    Args:
+        source_tar_path: Path of the OpenPose tar archive.
+        dest_tar_path: Path of the produced tar archive.
+        show_progress: Show a progress bar. Default to False.
+        body_regions: Body regions to extract.
+        n_coords: Number of coordinates per landmark.
+        n_decode_workers: Number of processes decoding the JSON frames. Default to 4.
+        n_serialize_workers: Number of threads serializing the numpy arrays. Default to 1.
+        queue_size: Max number of samples waiting in front of each stage, and in front of the writer. Default to 2.
+            Each queued sample holds all its frames: raw JSON before decoding, numpy arrays after.
+            Up to about `3 * queue_size + 2 * n_decode_workers + n_serialize_workers` samples are in memory
+            (samples being decoded are also copied to the worker processes), which matters when a sample
+            is a long recording, e.g. a whole BOBSL episode with `sub_tars` (hundreds of MB).
+        codec: Codec of the poses (see `sldp.poses.codecs.serialize_pose`). Default to npy.
+            With the `sparse` codec, `missing-person` and `multiple-people` frames are not stored.
+        codec_options: Options of the codec, e.g. `{"confidence_threshold": 0.1}` for the sparse codec,
+            or `{"frame_size": (1280, 720)}` for the quantized codec.
+    """
+    _run_conversion(
         source_tar_path,
+        _TarChunkWriter(dest_tar_path.replace("{", "{{").replace("}", "}}")),
         show_progress=show_progress,
         body_regions=body_regions,
         n_coords=n_coords,
-    ):
-        for region, pose in sample.poses.items():
-            add_file_to_tar(f"poses/{region}/{sample.id}.npy", dest_tar, pose)
-
-    # dest_buffer.seek(0)
-    with open(dest_tar_path, "wb") as dest_file:
-        dest_file.write(dest_buffer.getvalue())
-    dest_tar.close()
+        sub_tars=False,
+        n_decode_workers=n_decode_workers,
+        n_serialize_workers=n_serialize_workers,
+        queue_size=queue_size,
+        codec=codec,
+        codec_options=codec_options,
+    )
 
 
 def convert_open_pose_tar_to_chunks(
@@ -38,35 +162,35 @@ def convert_open_pose_tar_to_chunks(
     body_regions=("pose", "left_hand", "right_hand"),
     n_coords=3,
     sub_tars=False,
+    n_decode_workers=4,
+    n_serialize_workers=1,
+    queue_size=2,
+    codec="npy",
+    codec_options=None,
 ):
-    chunk_number = 1
-    dest_buffer = io.BytesIO()
-    dest_tar = tarfile.open(fileobj=dest_buffer, mode="w")
+    """
+    Converts an OpenPose tar archive into multiple tar archives (chunks) of numpy arrays.
 
-    for sample in read_open_pose_tar(
+    Same as `convert_open_pose_tar`, except that a new chunk is started each time
+    the current one exceeds `max_chunk_size` bytes. Chunk paths are obtained
+    with `dest_tar_path_template.format(chunk_number)`, starting at 1.
+
+    With `sub_tars`, each sample is a whole recording: keep `queue_size` and `n_decode_workers` small
+    to bound the memory (see `convert_open_pose_tar`).
+    """
+    _run_conversion(
         source_tar_path,
+        _TarChunkWriter(dest_tar_path_template, max_chunk_size),
         show_progress=show_progress,
         body_regions=body_regions,
         n_coords=n_coords,
         sub_tars=sub_tars,
-    ):
-        for region, pose in sample.poses.items():
-            add_file_to_tar(f"poses/{region}/{sample.id}.npy", dest_tar, pose)
-        if dest_buffer.tell() >= max_chunk_size:
-            output_path = dest_tar_path_template.format(chunk_number)
-            # dest_buffer.seek(0)
-            with open(output_path, "wb") as dest_file:
-                dest_file.write(dest_buffer.getvalue())
-            dest_tar.close()
-            chunk_number += 1
-            dest_buffer = io.BytesIO()
-            dest_tar = tarfile.open(fileobj=dest_buffer, mode="w")
-
-    output_path = dest_tar_path_template.format(chunk_number)
-    # dest_buffer.seek(0)
-    with open(output_path, "wb") as dest_file:
-        dest_file.write(dest_buffer.getvalue())
-    dest_tar.close()
+        n_decode_workers=n_decode_workers,
+        n_serialize_workers=n_serialize_workers,
+        queue_size=queue_size,
+        codec=codec,
+        codec_options=codec_options,
+    )
 
 
 if __name__ == "__main__":
@@ -1,10 +1,21 @@
+import asyncio
+import functools
+import math
+import os
 from pathlib import Path
-from typing import TypedDict
+from typing import Optional, TypedDict
 
 import numpy as np
-import sign_language_tools.pose.mediapipe.extraction as mp_extractor
 
-from sldp.utils.parallel import run_parallel
+from sldp.utils.parallel import get_worker_pool, run_parallel
+
+# cv2, mediapipe and sign_language_tools are imported in the functions using them:
+# they are slow to import, and only needed in the pose extraction workers.
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv", ".webm")
+N_LANDMARKS = {"pose": 33, "left_hand": 21, "right_hand": 21, "face": 478}
+# Number of frames before the first frame of a segment where the seek lands, decoded and skipped.
+SEEK_PREROLL_FRAMES = 30
 
 
 class PoseExtractionCommand(TypedDict):
@@ -13,20 +24,323 @@ class PoseExtractionCommand(TypedDict):
     dest_poses_dir: str
 
 
+def init_pose_extraction_worker():
+    """
+    Initializer of the pose extraction workers (see `get_worker_pool`): imports OpenCV, MediaPipe
+    and `sign_language_tools` once per process.
+
+    The landmarker itself is created for each video (or segment), as its tracking state
+    would otherwise carry over from one video to the next.
+    """
+    import cv2  # noqa: F401
+    import mediapipe  # noqa: F401
+    import sign_language_tools.pose.mediapipe.extraction  # noqa: F401
+
+
 def build_poses_from_sample(
         sample_id: str,
         src_video_path: str,
         dest_poses_dir: str,
+        model_path: str,
+        use_gpu: bool = False,
 ):
+    """
+    Extracts the poses of a video and saves them in `{dest_poses_dir}/{region}/{sample_id}.npy`.
+
+    Args:
+        sample_id: Id of the sample.
+        src_video_path: Path of the video.
+        dest_poses_dir: Directory of the extracted poses.
+        model_path: Path of the holistic landmarker model (`.task` file).
+        use_gpu: Run the landmarker on GPU. Default to False.
+    """
+    import sign_language_tools.pose.mediapipe.extraction as mp_extractor
+
     dest_poses_dir = Path(dest_poses_dir)
-    src_video_ext = Path(src_video_path).suffix
-    poses = mp_extractor.extract_poses_from_video(src_video_path, show_progress=True)
+    landmarker = mp_extractor.load_holistic_landmarker(model_path, use_gpu=use_gpu)
+    try:
+        poses = mp_extractor.extract_poses_from_video_file(src_video_path, landmarker)
+    finally:
+        landmarker.close()
     for region, region_poses in poses.items():
-        pose_path = dest_poses_dir / region / f"{sample_id}.{src_video_ext}"
+        pose_path = dest_poses_dir / region / f"{sample_id}.npy"
         pose_path.parent.mkdir(parents=True, exist_ok=True)
         np.save(pose_path, region_poses)
 
 
-def build_poses_from_samples(commands: list[PoseExtractionCommand], n_jobs: int = 8):
+def build_poses_from_samples(
+        commands: list[PoseExtractionCommand],
+        model_path: str,
+        n_jobs: int = 8,
+        use_gpu: bool = False,
+):
+    """
+    Extracts the poses of videos in parallel (see `build_poses_from_sample`).
+
+    The videos are processed by a persistent pool of workers, so that consecutive batches
+    do not pay the imports again.
+    """
     commands: list[dict]
-    run_parallel(build_poses_from_sample, commands, n_jobs=n_jobs)
+    run_parallel(
+        build_poses_from_sample,
+        [dict(command, model_path=model_path, use_gpu=use_gpu) for command in commands],
+        n_jobs=n_jobs,
+        initializer=init_pose_extraction_worker,
+    )
+
+
+def _iter_video_frames(src_video_path: str, start_frame: int, end_frame: Optional[int]):
+    """
+    Yields `(frame_nb, rgb_frame)` for the frames `[start_frame, end_frame)` of a video, decoded with
+    OpenCV (as with the vidgear decoding of `sign_language_tools`, which wraps `cv2.VideoCapture`).
+
+    Seeks are not frame-accurate with some codecs (e.g. H.264, where they may land on a keyframe).
+    The video is seeked a few frames before `start_frame`, the index of the frame where the seek
+    landed is computed from its timestamp, and the frames before `start_frame` are decoded and skipped.
+    If the seek lands after `start_frame`, the video is decoded from its start instead.
+    """
+    import cv2
+
+    capture = cv2.VideoCapture(src_video_path)
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        frame_nb = 0
+        if start_frame > 0:
+            capture.set(cv2.CAP_PROP_POS_FRAMES, max(0, start_frame - SEEK_PREROLL_FRAMES))
+            if capture.grab():
+                frame_nb = int(round(capture.get(cv2.CAP_PROP_POS_MSEC) * fps / 1000))
+            if frame_nb == 0 or frame_nb > start_frame:
+                capture.release()
+                capture = cv2.VideoCapture(src_video_path)
+                frame_nb = 0
+        if frame_nb == 0 and not capture.grab():
+            return
+        # A frame is grabbed, with index `frame_nb`.
+        while end_frame is None or frame_nb < end_frame:
+            if frame_nb >= start_frame:
+                success, frame = capture.retrieve()
+                if not success:
+                    break
+                yield frame_nb, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            if not capture.grab():
+                break
+            frame_nb += 1
+    finally:
+        capture.release()
+
+
+def extract_poses_from_video_segment(
+        src_video_path: str,
+        start_frame: int,
+        end_frame: Optional[int],
+        model_path: str,
+        use_gpu: bool = False,
+) -> dict[str, np.ndarray]:
+    """
+    Extracts the poses of the frames `[start_frame, end_frame)` of a video with a new MediaPipe holistic landmarker.
+
+    Args:
+        src_video_path: Path of the video.
+        start_frame: First frame of the segment.
+        end_frame: End of the segment (excluded). If None, the segment ends with the video.
+        model_path: Path of the holistic landmarker model (`.task` file).
+        use_gpu: Run the landmarker on GPU. Default to False.
+
+    Returns:
+        A mapping from body region to an array of shape (T, L, 3).
+    """
+    import cv2
+    import mediapipe as mp
+
+    import sign_language_tools.pose.mediapipe.extraction as mp_extractor
+
+    capture = cv2.VideoCapture(src_video_path)
+    fps = capture.get(cv2.CAP_PROP_FPS)
+    capture.release()
+    landmarker = mp_extractor.load_holistic_landmarker(model_path, use_gpu=use_gpu)
+    poses = {region: [] for region in N_LANDMARKS}
+    try:
+        for frame_nb, frame in _iter_video_frames(src_video_path, start_frame, end_frame):
+            image = mp.Image(mp.ImageFormat.SRGB, frame)
+            results = landmarker.detect_for_video(image, int(round(frame_nb * 1000 / fps)))
+            for region, landmarks in (
+                ("pose", results.pose_landmarks),
+                ("left_hand", results.left_hand_landmarks),
+                ("right_hand", results.right_hand_landmarks),
+                ("face", results.face_landmarks),
+            ):
+                poses[region].append(mp_extractor._landmarks_to_array(landmarks, N_LANDMARKS[region]))
+    finally:
+        landmarker.close()
+    return {
+        region: np.stack(region_poses, axis=0) if region_poses else np.empty((0, N_LANDMARKS[region], 3), dtype="float16")
+        for region, region_poses in poses.items()
+    }
+
+
+def _split_video_into_segments(
+        n_frames: int,
+        n_jobs: int,
+        segments_per_job: int,
+        min_segment_frames: int,
+) -> list[tuple[int, Optional[int]]]:
+    n_segments = max(1, min(n_jobs * segments_per_job, n_frames // min_segment_frames))
+    segment_frames = max(1, math.ceil(n_frames / n_segments))
+    boundaries = list(range(0, n_frames, segment_frames)) or [0]
+    # The last segment is read until the end of the video, as the frame count of the container may be inaccurate.
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:])] + [(boundaries[-1], None)]
+
+
+def build_poses_from_long_sample(
+        sample_id: str,
+        src_video_path: str,
+        dest_poses_dir: str,
+        model_path: str,
+        n_jobs: int = 8,
+        segments_per_job: int = 2,
+        min_segment_frames: int = 500,
+        use_gpu: bool = False,
+):
+    """
+    Extracts the poses of a long video (e.g. a DGS Corpus transcript) by splitting it into frame ranges
+    extracted in parallel, and joining the poses of each region in frame order.
+
+    The video is split into about `n_jobs * segments_per_job` segments, so that workers finishing early
+    take another segment, but each segment has at least `min_segment_frames` frames to amortize
+    the landmarker initialization and the seek. As each segment starts with a new landmarker (without
+    tracking state), the first frames of a segment may differ slightly from a single pass over the video.
+
+    Args:
+        sample_id: Id of the sample.
+        src_video_path: Path of the video.
+        dest_poses_dir: Directory of the extracted poses (`{region}/{sample_id}.npy`).
+        model_path: Path of the holistic landmarker model (`.task` file).
+        n_jobs: Number of processes. Default to 8.
+        segments_per_job: Number of segments per process. Default to 2.
+        min_segment_frames: Min number of frames per segment. Default to 500.
+        use_gpu: Run the landmarker on GPU. Default to False.
+    """
+    import cv2
+
+    capture = cv2.VideoCapture(src_video_path)
+    n_frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    capture.release()
+    segments = _split_video_into_segments(n_frames, n_jobs, segments_per_job, min_segment_frames)
+    segment_poses = run_parallel(
+        extract_poses_from_video_segment,
+        [
+            dict(src_video_path=src_video_path, start_frame=start, end_frame=end, model_path=model_path, use_gpu=use_gpu)
+            for start, end in segments
+        ],
+        n_jobs=n_jobs,
+        initializer=init_pose_extraction_worker,
+    )
+    for (start, end), poses in zip(segments, segment_poses):
+        n_segment_frames = len(poses["pose"])
+        if end is not None and n_segment_frames != end - start:
+            raise ValueError(
+                f"Segment [{start}, {end}) of video [{src_video_path}] has {n_segment_frames} frames, "
+                f"the joined poses would not be aligned with the video."
+            )
+    dest_poses_dir = Path(dest_poses_dir)
+    for region in N_LANDMARKS:
+        pose_path = dest_poses_dir / region / f"{sample_id}.npy"
+        pose_path.parent.mkdir(parents=True, exist_ok=True)
+        np.save(pose_path, np.concatenate([poses[region] for poses in segment_poses], axis=0))
+
+
+def _has_poses(dest_poses_dir: str, sample_id: str) -> bool:
+    return any(Path(dest_poses_dir).glob(f"*/{sample_id}.npy"))
+
+
+async def download_and_extract_poses(
+    files_to_download: list[tuple[str, str]],
+    dest_poses_dir: str,
+    model_path: str,
+    n_jobs: int = 8,
+    max_pending_videos: int = 16,
+    delete_videos: bool = False,
+    use_gpu: bool = False,
+    **download_kwargs,
+) -> list[tuple[str, bool]]:
+    """
+    Downloads files and extracts the poses of the videos as soon as each one is downloaded,
+    so that downloading and pose extraction overlap.
+
+    Downloaded videos wait in a bounded queue in front of a pool of `n_jobs` processes.
+    When the queue is full, downloads are paused, so at most
+    `max_concurrent + max_pending_videos + n_jobs` videos are on disk at the same time
+    if `delete_videos` is True. Videos that already exist are extracted too,
+    unless their poses already exist in `dest_poses_dir`.
+
+    Args:
+        files_to_download: A list of (source_url, dest_filepath) tuples. Only videos are extracted.
+        dest_poses_dir: Directory of the extracted poses (`{region}/{sample_id}.npy`).
+        model_path: Path of the holistic landmarker model (`.task` file).
+        n_jobs: Number of pose extraction processes. Default to 8.
+        max_pending_videos: Max number of downloaded videos waiting for extraction. Default to 16.
+        delete_videos: Delete each video after the successful extraction of its poses. Default to False.
+        use_gpu: Run the landmarker on GPU. Default to False.
+        **download_kwargs: Other arguments of `download_files`.
+
+    Returns:
+        A list of (filepath, success_boolean) tuples for the extracted videos, and for the files
+        that could not be downloaded.
+    """
+    from sldp.utils.download import download_files
+
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=max_pending_videos)
+    results = []
+
+    def is_video(filepath: str) -> bool:
+        return Path(filepath).suffix.lower() in VIDEO_EXTENSIONS
+
+    # Videos whose poses are already extracted may have been deleted, do not download them again.
+    files_to_download = [
+        (url, dest_filepath) for url, dest_filepath in files_to_download
+        if not (is_video(dest_filepath) and _has_poses(dest_poses_dir, Path(dest_filepath).stem))
+    ]
+
+    async def enqueue(video_path: str, success: bool):
+        if success and is_video(video_path):
+            await queue.put(video_path)
+
+    async def enqueue_existing_videos():
+        if not download_kwargs.get("skip_existing", True):
+            return
+        for _, dest_filepath in files_to_download:
+            if is_video(dest_filepath) and os.path.exists(dest_filepath):
+                await queue.put(dest_filepath)
+
+    async def extract_poses(executor):
+        while (video_path := await queue.get()) is not None:
+            extraction = functools.partial(
+                build_poses_from_sample,
+                sample_id=Path(video_path).stem,
+                src_video_path=video_path,
+                dest_poses_dir=dest_poses_dir,
+                model_path=model_path,
+                use_gpu=use_gpu,
+            )
+            try:
+                await loop.run_in_executor(executor, extraction)
+            except Exception as err:
+                print(f"Pose extraction FAILED for {video_path}: {err}")
+                results.append((video_path, False))
+                continue
+            results.append((video_path, True))
+            if delete_videos:
+                os.remove(video_path)
+
+    executor = get_worker_pool(n_jobs, initializer=init_pose_extraction_worker)
+    consumers = [asyncio.create_task(extract_poses(executor)) for _ in range(n_jobs)]
+    _, download_results = await asyncio.gather(
+        enqueue_existing_videos(),
+        download_files(files_to_download, on_complete=enqueue, **download_kwargs),
+    )
+    results += [(filepath, False) for filepath, success in download_results if not success]
+    for _ in consumers:
+        await queue.put(None)
+    await asyncio.gather(*consumers)
+    return results
@@ -105,6 +105,76 @@ def read_open_pose_frame(
     return poses, status
 
 
+def _iter_raw_samples(tar_filepath: Path, sub_tars: bool):
+    """
+    Yields `(sample_id, raw_frames)` tuples from an OpenPose tar archive,
+    where `raw_frames` maps frame numbers to the undecoded JSON content of each frame.
+    """
+    gzip = tar_filepath.name.endswith(".tar.gz")
+    current_sample_id = None
+    current_frames = dict()
+    with tarfile.open(tar_filepath, "r|gz" if gzip else "r|") as tar:
+        for member, tar_context in _iter_json_members(tar, sub_tars):
+            extracted_file = tar_context.extractfile(member)
+            if extracted_file is None:
+                raise ValueError(f"Could not extract file [{member.name}].")
+            sample_id, frame_nb, _ = member.name.split("/")[-1].rsplit("_", 2)
+            if current_sample_id is None:
+                current_sample_id = sample_id
+            if current_sample_id != sample_id:
+                yield current_sample_id, current_frames
+                current_sample_id = sample_id
+                current_frames = dict()
+            current_frames[int(frame_nb)] = extracted_file.read()
+    if current_sample_id is not None and current_frames:
+        yield current_sample_id, current_frames
+
+
+def decode_open_pose_sample(
+    sample_id: str,
+    raw_frames: dict[int, bytes],
+    body_regions=("pose", "left_hand", "right_hand"),
+    n_coords=3,
+) -> Pose:
+    frame_poses = {
+        frame_nb: read_open_pose_frame(
+            orjson.loads(raw_frame),
+            body_regions=body_regions,
+            n_coords=n_coords,
+        )
+        for frame_nb, raw_frame in raw_frames.items()
+    }
+    merged_poses, merged_status = _merge_poses(frame_poses)
+    return Pose(
+        id=sample_id,
+        n_frames=len(frame_poses),
+        n_coords=n_coords,
+        body_regions=body_regions,
+        poses=merged_poses,
+        frame_statuses=merged_status,
+    )
+
+
+def iter_raw_open_pose_samples(
+    tar_filepath: str,
+    show_progress=False,
+    sub_tars=False,
+):
+    """
+    Reads an OpenPose tar archive without decoding the frames.
+
+    Yields:
+        `(sample_id, raw_frames)` tuples, to be decoded with `decode_open_pose_sample`.
+    """
+    tar_filepath = Path(tar_filepath)
+    yield from tqdm(
+        _iter_raw_samples(tar_filepath, sub_tars),
+        desc=f"Reading OpenPose files [{tar_filepath.name}]",
+        unit=" samples",
+        disable=not show_progress,
+    )
+
+
 def read_open_pose_tar(
     tar_filepath: str,
     show_progress=False,
@@ -112,56 +182,11 @@ def read_open_pose_tar(
     n_coords=3,
     sub_tars=False,
 ):
-    tar_filepath = Path(tar_filepath)
-    gzip = tar_filepath.name.endswith(".tar.gz")
-    current_sample_id = None
-    current_poses = dict()
-    with tarfile.open(tar_filepath, "r|gz" if gzip else "r|") as tar:
-        iterator = _iter_json_members(tar, sub_tars)
-        for member, tar_context in tqdm(
-            iterator,
-            desc=f"Reading OpenPose files [{tar_filepath.name}]",
-            unit=" files",
-            disable=not show_progress,
-        ):
-            if member.isfile() and member.name.endswith("_keypoints.json"):
-                extracted_file = tar_context.extractfile(member)
-                if extracted_file is not None:
-                    frame_poses = read_open_pose_frame(
-                        orjson.loads(extracted_file.read()),
-                        body_regions=body_regions,
-                        n_coords=n_coords,
-                    )
-                    sample_id, frame_nb, _ = member.name.split("/")[-1].rsplit("_", 2)
-
-                    if current_sample_id is None:
-                        current_sample_id = sample_id
-
-                    if current_sample_id != sample_id:
-                        merged_poses, merged_status = _merge_poses(current_poses)
-                        yield Pose(
-                            id=current_sample_id,
-                            n_frames=len(current_poses),
-                            n_coords=n_coords,
-                            body_regions=body_regions,
-                            poses=merged_poses,
-                            frame_statuses=merged_status,
-                        )
-                        current_sample_id = sample_id
-                        current_poses = dict()
-
-                    current_poses[int(frame_nb)] = frame_poses
-                else:
-                    raise ValueError(f"Could not extract file [{member.name}].")
-    if current_sample_id is not None and current_poses:
-        merged_poses, merged_status = _merge_poses(current_poses)
-        yield Pose(
-            id=current_sample_id,
-            n_frames=len(current_poses),
-            n_coords=n_coords,
-            body_regions=body_regions,
-            poses=merged_poses,
-            frame_statuses=merged_status,
+    for sample_id, raw_frames in iter_raw_open_pose_samples(
+        tar_filepath, show_progress=show_progress, sub_tars=sub_tars
+    ):
+        yield decode_open_pose_sample(
+            sample_id, raw_frames, body_regions=body_regions, n_coords=n_coords
         )
 
 
@@ -0,0 +1,350 @@
+import dataclasses
+from typing import Optional
+
+import numpy as np
+
+from sldp.poses.load_openpose import Pose
+
+
+def _concatenate(poses: list[np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+    lengths = np.array([pose.shape[0] for pose in poses], dtype="int64")
+    return np.concatenate(poses, axis=0).astype("float32"), lengths
+
+
+def _split(data: np.ndarray, lengths: np.ndarray) -> list[np.ndarray]:
+    return np.split(data, np.cumsum(lengths)[:-1], axis=0)
+
+
+def _sample_starts_and_ends(lengths: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Returns, for each frame of the concatenated data, the first and last frame indices of its sample."""
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    return np.repeat(starts, lengths), np.repeat(ends - 1, lengths)
+
+
+def fill_missing_frames(data: np.ndarray, lengths: np.ndarray, fill_edges: bool = True) -> np.ndarray:
+    """
+    Linearly interpolates missing (NaN) values along time, for all the samples at once.
+
+    Args:
+        data: Concatenated poses of all samples, of shape (N, L, C).
+        lengths: Number of frames of each sample. Interpolation never crosses sample boundaries.
+        fill_edges: Fill missing values at the start and end of each sample with the nearest valid value.
+            Otherwise, they are left as NaN. Default to True.
+
+    Returns:
+        The interpolated poses, of shape (N, L, C).
+        Values of landmarks that are missing in all the frames of a sample stay NaN.
+    """
+    n_frames = data.shape[0]
+    flat_data = data.reshape(n_frames, -1)
+    valid = ~np.isnan(flat_data)
+    frame_indices = np.arange(n_frames)[:, None]
+    starts, ends = _sample_starts_and_ends(lengths)
+
+    prev_valid = np.maximum.accumulate(np.where(valid, frame_indices, -1), axis=0)
+    next_valid = np.minimum.accumulate(np.where(valid, frame_indices, n_frames)[::-1], axis=0)[::-1]
+    has_prev = prev_valid >= starts[:, None]
+    has_next = next_valid <= ends[:, None]
+
+    if fill_edges:
+        prev_valid = np.where(has_prev, prev_valid, next_valid)
+        next_valid = np.where(has_next, next_valid, prev_valid)
+        fillable = has_prev | has_next
+    else:
+        fillable = has_prev & has_next
+    prev_valid = np.where(fillable, prev_valid, frame_indices)
+    next_valid = np.where(fillable, next_valid, frame_indices)
+
+    columns = np.arange(flat_data.shape[1])[None, :]
+    prev_values = flat_data[prev_valid, columns]
+    next_values = flat_data[next_valid, columns]
+    span = next_valid - prev_valid
+    weights = np.divide(frame_indices - prev_valid, span, out=np.zeros(span.shape, dtype="float32"), where=span > 0)
+    interpolated = prev_values + weights * (next_values - prev_values)
+    return np.where(valid, flat_data, interpolated).reshape(data.shape)
+
+
+def normalize_poses(
+    data: dict[str, np.ndarray],
+    lengths: np.ndarray,
+    reference_region: str = "pose",
+    shoulder_indices: tuple[int, int] = (2, 5),
+    video_sizes: Optional[np.ndarray] = None,
+) -> dict[str, np.ndarray]:
+    """
+    Centers the poses of each sample on the middle of the shoulders and scales them by the shoulder width.
+
+    The center and the scale are averaged over all the frames of a sample.
+    Samples where the shoulders are never visible are normalized using the video frame
+    (center of the frame and largest side) if `video_sizes` is given, and are left unchanged otherwise.
+    Only the first two coordinates (x, y) are normalized.
+
+    The default shoulder indices match the OpenPose BODY_25 layout, the WLASL upper pose and the LSA64 pose.
+
+    Args:
+        data: Concatenated poses of all samples for each body region, of shape (N, L, C).
+        lengths: Number of frames of each sample.
+        reference_region: Body region containing the shoulders. Default to "pose".
+        shoulder_indices: Indices of the two shoulders in the reference region.
+        video_sizes: Width and height of the video of each sample, of shape (S, 2). Default to None.
+
+    Returns:
+        The normalized poses for each body region.
+    """
+    n_samples = lengths.shape[0]
+    shoulders = data[reference_region][:, list(shoulder_indices), :2]
+    centers = shoulders.mean(axis=1)
+    widths = np.linalg.norm(shoulders[:, 0] - shoulders[:, 1], axis=-1)
+    valid = ~(np.isnan(centers).any(axis=-1) | np.isnan(widths) | (widths <= 0))
+
+    sample_ids = np.repeat(np.arange(n_samples), lengths)
+    counts = np.bincount(sample_ids, weights=valid, minlength=n_samples)
+    sample_centers = np.stack([
+        np.bincount(sample_ids, weights=np.where(valid, centers[:, i], 0), minlength=n_samples)
+        for i in range(2)
+    ], axis=-1)
+    sample_widths = np.bincount(sample_ids, weights=np.where(valid, widths, 0), minlength=n_samples)
+    has_shoulders = counts > 0
+    sample_centers[has_shoulders] /= counts[has_shoulders, None]
+    sample_widths[has_shoulders] /= counts[has_shoulders]
+
+    fallback_centers = np.zeros((n_samples, 2))
+    fallback_widths = np.ones(n_samples)
+    if video_sizes is not None:
+        video_sizes = np.asarray(video_sizes, dtype="float64")
+        known_size = ~np.isnan(video_sizes).any(axis=-1)
+        fallback_centers[known_size] = video_sizes[known_size] / 2
+        fallback_widths[known_size] = video_sizes[known_size].max(axis=-1)
+    sample_centers = np.where(has_shoulders[:, None], sample_centers, fallback_centers)
+    sample_widths = np.where(has_shoulders, sample_widths, fallback_widths)
+
+    frame_centers = sample_centers[sample_ids][:, None, :].astype("float32")
+    frame_widths = sample_widths[sample_ids][:, None, None].astype("float32")
+    normalized_data = {}
+    for region, region_data in data.items():
+        region_data = region_data.copy()
+        region_data[..., :2] = (region_data[..., :2] - frame_centers) / frame_widths
+        normalized_data[region] = region_data
+    return normalized_data
+
+
+def resample_poses(
+    data: np.ndarray,
+    lengths: np.ndarray,
+    src_fps: np.ndarray,
+    dst_fps: float,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Temporally resamples the poses of all samples at once with linear interpolation.
+
+    Args:
+        data: Concatenated poses of all samples, of shape (N, L, C).
+        lengths: Number of frames of each sample.
+        src_fps: Frame rate of each sample, of shape (S,).
+        dst_fps: Target frame rate.
+
+    Returns:
+        The concatenated resampled poses, of shape (N', L, C), and the new number of frames of each sample.
+    """
+    src_fps = np.broadcast_to(np.asarray(src_fps, dtype="float64"), lengths.shape)
+    new_lengths = np.where(
+        lengths > 0,
+        np.maximum(np.round(lengths * dst_fps / src_fps).astype("int64"), 1),
+        0,
+    )
+    src_starts = np.cumsum(lengths) - lengths
+    new_starts = np.cumsum(new_lengths) - new_lengths
+    sample_ids = np.repeat(np.arange(lengths.shape[0]), new_lengths)
+    new_frame_indices = np.arange(new_lengths.sum()) - new_starts[sample_ids]
+
+    positions = new_frame_indices * (src_fps[sample_ids] / dst_fps)
+    positions = np.minimum(positions, lengths[sample_ids] - 1)
+    lower = np.floor(positions).astype("int64")
+    upper = np.minimum(lower + 1, lengths[sample_ids] - 1)
+    weights = (positions - lower).astype("float32")[:, None, None]
+    lower += src_starts[sample_ids]
+    upper += src_starts[sample_ids]
+    resampled = data[lower] + weights * (data[upper] - data[lower])
+    return resampled, new_lengths
+
+
+def preprocess_poses(
+    poses: list[dict[str, np.ndarray]],
+    video_sizes: Optional[np.ndarray] = None,
+    video_fps: Optional[np.ndarray] = None,
+    target_fps: Optional[float] = None,
+    normalize: bool = True,
+    fill_missing: bool = True,
+    reference_region: str = "pose",
+    shoulder_indices: tuple[int, int] = (2, 5),
+    dtype="float16",
+) -> list[dict[str, np.ndarray]]:
+    """
+    Preprocesses the poses of many samples at once, by concatenating all of them along time.
+
+    Steps (in order):
+      1. linear interpolation of missing (NaN) frames and landmarks;
+      2. shoulder-centered scale normalization;
+      3. temporal resampling to the target frame rate.
+
+    Args:
+        poses: Poses of each sample, as a mapping from body region to an array of shape (T, L, C).
+        video_sizes: Width and height of the video of each sample, of shape (S, 2). Default to None.
+        video_fps: Frame rate of each sample, of shape (S,) or a scalar. Required if `target_fps` is given.
+        target_fps: Target frame rate. Default to None (no resampling).
+        normalize: Apply the shoulder-centered scale normalization. Default to True.
+        fill_missing: Interpolate missing values. Default to True.
+        reference_region: Body region containing the shoulders. Default to "pose".
+        shoulder_indices: Indices of the two shoulders in the reference region.
+        dtype: Data type of the returned arrays. Default to float16.
+
+    Returns:
+        The preprocessed poses of each sample, in the same order.
+    """
+    if len(poses) == 0:
+        return []
+    if target_fps is not None and video_fps is None:
+        raise ValueError("The frame rate of the samples is required for resampling.")
+    regions = list(poses[0].keys())
+    data, lengths = {}, None
+    for region in regions:
+        data[region], lengths = _concatenate([sample_poses[region] for sample_poses in poses])
+    if fill_missing:
+        data = {region: fill_missing_frames(region_data, lengths) for region, region_data in data.items()}
+    if normalize:
+        data = normalize_poses(
+            data,
+            lengths,
+            reference_region=reference_region,
+            shoulder_indices=shoulder_indices,
+            video_sizes=video_sizes,
+        )
+    new_lengths = lengths
+    if target_fps is not None:
+        for region in regions:
+            data[region], new_lengths = resample_poses(data[region], lengths, video_fps, target_fps)
+    split_data = {region: _split(data[region].astype(dtype), new_lengths) for region in regions}
+    return [{region: split_data[region][idx] for region in regions} for idx in range(len(poses))]
+
+
+def _get_metadata_array(samples: list[dict], keys: tuple[str, ...]) -> Optional[np.ndarray]:
+    values = []
+    for sample in samples:
+        metadata = sample.get("metadata", {})
+        values.append([metadata.get(key, np.nan) for key in keys])
+    values = np.array(values, dtype="float64")
+    if np.isnan(values).all():
+        return None
+    return values
+
+
+def preprocess_samples(
+    samples: list[dict],
+    target_fps: Optional[float] = None,
+    default_fps: Optional[float] = None,
+    **kwargs,
+) -> list[dict]:
+    """
+    Preprocesses samples (e.g. from `read_wlasl_format_csv`) with `preprocess_poses`, using their metadata
+    (`video_width`, `video_height`, `video_fps`) when available.
+
+    Args:
+        samples: Samples containing the poses in `sample['poses']`.
+        target_fps: Target frame rate. Default to None (no resampling).
+        default_fps: Frame rate of the samples without `video_fps` metadata. Default to None.
+        **kwargs: Other arguments of `preprocess_poses`.
+
+    Returns:
+        New samples, with the preprocessed poses.
+    """
+    video_sizes = _get_metadata_array(samples, ("video_width", "video_height"))
+    video_fps = None
+    if target_fps is not None:
+        video_fps = _get_metadata_array(samples, ("video_fps",))
+        video_fps = np.full(len(samples), np.nan) if video_fps is None else video_fps[:, 0]
+        if default_fps is not None:
+            video_fps = np.where(np.isnan(video_fps), default_fps, video_fps)
+        if np.isnan(video_fps).any():
+            raise ValueError("Missing frame rate for some samples. Use `default_fps`.")
+    new_poses = preprocess_poses(
+        [sample["poses"] for sample in samples],
+        video_sizes=video_sizes,
+        video_fps=video_fps,
+        target_fps=target_fps,
+        **kwargs,
+    )
+    return [{**sample, "poses": poses} for sample, poses in zip(samples, new_poses)]
+
+
+def _mask_low_confidence(pose: np.ndarray, confidence_threshold: float) -> np.ndarray:
+    """Sets the x and y coordinates of the landmarks with a confidence of at most `confidence_threshold` to NaN."""
+    if pose.shape[2] != 3:
+        return pose
+    pose = pose.copy()
+    pose[pose[..., 2] <= confidence_threshold, :2] = np.nan
+    return pose
+
+
+def preprocess_open_pose_samples(
+    samples: list[Pose],
+    video_size: Optional[tuple[int, int]] = None,
+    video_fps: Optional[float] = None,
+    target_fps: Optional[float] = None,
+    confidence_threshold: Optional[float] = 0.0,
+    **kwargs,
+) -> list[Pose]:
+    """
+    Preprocesses OpenPose samples (e.g. from `read_open_pose_tar`) with `preprocess_poses`.
+    Only the first two coordinates are normalized, the confidence is kept as is.
+
+    OpenPose outputs undetected keypoints as (0, 0, 0). With 3 coordinates, the landmarks whose confidence
+    is at most `confidence_threshold` are treated as missing: their x and y coordinates are set to NaN
+    before the gap filling and the normalization, so that they are interpolated instead of pulling
+    the poses and the shoulders towards the origin. Their confidence is kept, so filled landmarks can be told apart.
+
+    Args:
+        samples: OpenPose samples.
+        video_size: Width and height of the videos. Default to None.
+        video_fps: Frame rate of the videos. Required if `target_fps` is given.
+        target_fps: Target frame rate. Default to None (no resampling).
+        confidence_threshold: Landmarks with a confidence of at most this value are missing.
+            Default to 0 (undetected keypoints). None to keep all the landmarks.
+        **kwargs: Other arguments of `preprocess_poses`.
+
+    Returns:
+        New samples, with the preprocessed poses. If the samples are resampled,
+        the frame statuses are resampled with the nearest frame.
+    """
+    video_sizes = None if video_size is None else np.tile(np.asarray(video_size, dtype="float64"), (len(samples), 1))
+    poses = [sample.poses for sample in samples]
+    if confidence_threshold is not None:
+        poses = [
+            {region: _mask_low_confidence(pose, confidence_threshold) for region, pose in sample_poses.items()}
+            for sample_poses in poses
+        ]
+    new_poses = preprocess_poses(
+        poses,
+        video_sizes=video_sizes,
+        video_fps=video_fps,
+        target_fps=target_fps,
+        **kwargs,
+    )
+    new_samples = []
+    for sample, poses in zip(samples, new_poses):
+        n_frames = next(iter(poses.values())).shape[0]
+        frame_statuses = sample.frame_statuses
+        if n_frames != sample.n_frames:
+            nearest_frames = np.minimum(np.round(np.arange(n_frames) * (sample.n_frames / n_frames)), sample.n_frames - 1)
+            frame_statuses = [frame_statuses[int(idx)] for idx in nearest_frames]
+        new_samples.append(dataclasses.replace(sample, n_frames=n_frames, poses=poses, frame_statuses=frame_statuses))
+    return new_samples
+
+
+if __name__ == "__main__":
+    from sldp.csv.wlasl_format import read_wlasl_format_csv
+    from sldp.webdatasets.simple_islr import build_simple_islr_webdataset
+
+    samples = read_wlasl_format_csv("E:/datasets/sign-language/wlasl/spoter/WLASL100_train_25fps.csv")
+    samples = preprocess_samples(samples, reference_region="upper_pose")
+    build_simple_islr_webdataset(samples, "E:/datasets/sign-language/wlasl/simple_shards/asl100_train_normalized.tar")
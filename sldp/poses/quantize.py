@@ -0,0 +1,137 @@
+import dataclasses
+import io
+from typing import Optional
+
+import numpy as np
+
+
+N_LEVELS = 2**16
+
+
+@dataclasses.dataclass(frozen=True)
+class QuantizedPose:
+    """
+    Pose array of shape (T, L, C) quantized to int16 fixed point, with a per-sample offset and scale
+    for each coordinate: `value = (code + 32768) * scale + offset`.
+
+    Attributes:
+        dtype: Data type of the original array.
+        offset: Offset of each coordinate, of shape (C,).
+        scale: Scale of each coordinate, of shape (C,).
+        codes: Quantized values of shape (T, L, C), delta-encoded along time if `delta` is True.
+        nan_mask: Boolean mask of the NaN values, of shape (T, L, C).
+        delta: Whether the codes are differences between consecutive frames.
+    """
+    dtype: np.dtype
+    offset: np.ndarray
+    scale: np.ndarray
+    codes: np.ndarray
+    nan_mask: np.ndarray
+    delta: bool
+
+    @property
+    def shape(self) -> tuple[int, ...]:
+        return self.codes.shape
+
+    @property
+    def max_error(self) -> np.ndarray:
+        """
+        Max absolute reconstruction error of each coordinate, of shape (C,), up to the float32 rounding
+        of the decoding and the cast to the original data type (at most half a unit in the last place of that type).
+        """
+        return self.scale / 2
+
+    def to_dense(self, dtype=None) -> np.ndarray:
+        """Rebuilds the (T, L, C) array, in the original data type unless `dtype` is given."""
+        codes = np.cumsum(self.codes, axis=0, dtype="int16") if self.delta else self.codes
+        values = (codes.astype("float32") + N_LEVELS // 2) * self.scale.astype("float32") + self.offset.astype("float32")
+        values[self.nan_mask] = np.nan
+        return values.astype(dtype or self.dtype, copy=False)
+
+
+def _forward_fill(codes: np.ndarray, nan_mask: np.ndarray) -> np.ndarray:
+    """Replaces the NaN codes by the code of the same landmark in the last frame where it is not NaN."""
+    frame_indices = np.where(nan_mask, 0, np.arange(len(codes)).reshape(-1, *([1] * (codes.ndim - 1))))
+    np.maximum.accumulate(frame_indices, axis=0, out=frame_indices)
+    return np.take_along_axis(codes, frame_indices, axis=0)
+
+
+def encode_quantized_pose(
+        pose: np.ndarray,
+        delta: bool = True,
+        frame_size: Optional[tuple[float, float]] = None,
+) -> QuantizedPose:
+    """
+    Quantizes a pose array of shape (T, L, C) to int16 fixed point.
+
+    The offset and scale of each coordinate are computed from the range of the values of the sample.
+    If `frame_size` is given, the range of the x and y coordinates also covers the video frame,
+    so that their max error is at most `max(width, height) / 65535 / 2` (e.g. 0.015 pixel for a 1920x1080 video,
+    or 7.6e-6 for normalized coordinates with a frame size of (1, 1)).
+
+    With `delta`, each frame is stored as its difference with the previous one (NaN values repeat
+    the last known value), which compresses much better as consecutive frames are highly correlated.
+
+    Args:
+        pose: Pose array of shape (T, L, C).
+        delta: Delta-encode the codes along time. Default to True.
+        frame_size: Width and height of the video frame, in the unit of the coordinates. Default to None.
+
+    Returns:
+        The quantized pose. Its `max_error` attribute gives the max reconstruction error of each coordinate.
+    """
+    if pose.ndim != 3:
+        raise ValueError(f"Expected a pose array of shape (T, L, C), got {pose.shape}.")
+    values = pose.astype("float64")
+    nan_mask = np.isnan(values)
+    n_coords = pose.shape[2]
+    low = np.zeros(n_coords)
+    high = np.zeros(n_coords)
+    has_values = ~nan_mask.all(axis=(0, 1))
+    if has_values.any():
+        low[has_values] = np.nanmin(values[:, :, has_values], axis=(0, 1))
+        high[has_values] = np.nanmax(values[:, :, has_values], axis=(0, 1))
+    if frame_size is not None:
+        n_frame_coords = min(2, n_coords)
+        low[:n_frame_coords] = np.minimum(low[:n_frame_coords], 0)
+        high[:n_frame_coords] = np.maximum(high[:n_frame_coords], frame_size[:n_frame_coords])
+    scale = (high - low) / (N_LEVELS - 1)
+    levels = np.divide(values - low, scale, out=np.zeros_like(values), where=(scale > 0) & ~nan_mask)
+    codes = (np.rint(levels) - N_LEVELS // 2).astype("int16")
+    if delta:
+        codes = _forward_fill(codes, nan_mask)
+        # Differences wrap around in int16, and the cumulative sum of the decoding wraps back.
+        codes = np.diff(codes, axis=0, prepend=np.zeros((1, *codes.shape[1:]), dtype="int16"))
+    return QuantizedPose(pose.dtype, low, scale, codes, nan_mask, delta)
+
+
+def quantized_pose_to_bytes(quantized_pose: QuantizedPose, compress: bool = True) -> bytes:
+    """
+    Serializes a quantized pose as a `.npz` archive, with a bit-packed NaN mask.
+    """
+    buffer = io.BytesIO()
+    (np.savez_compressed if compress else np.savez)(
+        buffer,
+        dtype=np.array(quantized_pose.dtype.str),
+        offset=quantized_pose.offset,
+        scale=quantized_pose.scale,
+        codes=quantized_pose.codes,
+        nan_mask=np.packbits(quantized_pose.nan_mask.ravel()),
+        delta=np.array(quantized_pose.delta),
+    )
+    return buffer.getvalue()
+
+
+def quantized_pose_from_bytes(data: bytes) -> QuantizedPose:
+    """Deserializes a quantized pose serialized with `quantized_pose_to_bytes`."""
+    with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+        codes = arrays["codes"]
+        nan_mask = np.unpackbits(arrays["nan_mask"], count=codes.size).astype(bool).reshape(codes.shape)
+        return QuantizedPose(
+            dtype=np.dtype(str(arrays["dtype"])),
+            offset=arrays["offset"],
+            scale=arrays["scale"],
+            codes=codes,
+            nan_mask=nan_mask,
+            delta=bool(arrays["delta"]),
+        )
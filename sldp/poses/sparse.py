@@ -0,0 +1,97 @@
+import dataclasses
+import io
+from typing import Optional
+
+import numpy as np
+
+
+@dataclasses.dataclass(frozen=True)
+class SparsePose:
+    """
+    Sparse layout of a pose array of shape (T, L, C): only the valid frames are stored,
+    and optionally only the landmarks of these frames with a sufficient confidence.
+
+    Attributes:
+        shape: Shape (T, L, C) of the dense array.
+        frame_mask: Boolean mask of the valid frames, of shape (T,).
+        landmark_mask: Boolean mask of the kept landmarks of the valid frames, of shape (V, L),
+            or None if all the landmarks of the valid frames are kept.
+        values: Values of the kept landmarks, of shape (V, L, C) without landmark mask, (K, C) otherwise.
+    """
+    shape: tuple[int, int, int]
+    frame_mask: np.ndarray
+    landmark_mask: Optional[np.ndarray]
+    values: np.ndarray
+
+    @property
+    def n_frames(self) -> int:
+        return self.shape[0]
+
+    def to_dense(self, fill_value: float = np.nan) -> np.ndarray:
+        """Rebuilds the dense (T, L, C) array. Missing frames and dropped landmarks are filled with `fill_value`."""
+        dense = np.full(self.shape, fill_value, dtype=self.values.dtype)
+        if self.landmark_mask is None:
+            dense[self.frame_mask] = self.values
+        else:
+            valid_frames = np.full((len(self.landmark_mask), *self.shape[1:]), fill_value, dtype=self.values.dtype)
+            valid_frames[self.landmark_mask] = self.values
+            dense[self.frame_mask] = valid_frames
+        return dense
+
+
+def encode_sparse_pose(pose: np.ndarray, confidence_threshold: Optional[float] = None) -> SparsePose:
+    """
+    Encodes a pose array of shape (T, L, C) in the sparse layout.
+
+    Frames whose values are all NaN (e.g. `missing-person` and `multiple-people` frames of OpenPose)
+    are not stored.
+
+    Args:
+        pose: Pose array of shape (T, L, C).
+        confidence_threshold: If given, the landmarks of the valid frames whose confidence
+            (last coordinate, C must be 3) is lower than the threshold are not stored either. Default to None.
+
+    Returns:
+        The sparse pose.
+    """
+    if pose.ndim != 3:
+        raise ValueError(f"Expected a pose array of shape (T, L, C), got {pose.shape}.")
+    frame_mask = ~np.isnan(pose).all(axis=(1, 2))
+    values = pose[frame_mask]
+    landmark_mask = None
+    if confidence_threshold is not None:
+        if pose.shape[2] != 3:
+            raise ValueError(f"A confidence threshold requires poses with 3 coordinates, got {pose.shape[2]}.")
+        landmark_mask = values[:, :, 2] >= confidence_threshold
+        values = values[landmark_mask]
+    return SparsePose(tuple(pose.shape), frame_mask, landmark_mask, values)
+
+
+def sparse_pose_to_bytes(sparse_pose: SparsePose, compress: bool = False) -> bytes:
+    """
+    Serializes a sparse pose as a `.npz` archive, with bit-packed masks.
+    """
+    arrays = {
+        "shape": np.array(sparse_pose.shape, dtype="int64"),
+        "frame_mask": np.packbits(sparse_pose.frame_mask),
+        "values": sparse_pose.values,
+    }
+    if sparse_pose.landmark_mask is not None:
+        arrays["landmark_mask"] = np.packbits(sparse_pose.landmark_mask.ravel())
+    buffer = io.BytesIO()
+    (np.savez_compressed if compress else np.savez)(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def sparse_pose_from_bytes(data: bytes) -> SparsePose:
+    """Deserializes a sparse pose serialized with `sparse_pose_to_bytes`."""
+    with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+        shape = tuple(int(x) for x in arrays["shape"])
+        frame_mask = np.unpackbits(arrays["frame_mask"], count=shape[0]).astype(bool)
+        values = arrays["values"]
+        landmark_mask = None
+        if "landmark_mask" in arrays:
+            n_valid_frames = int(frame_mask.sum())
+            landmark_mask = np.unpackbits(arrays["landmark_mask"], count=n_valid_frames * shape[1])
+            landmark_mask = landmark_mask.astype(bool).reshape(n_valid_frames, shape[1])
+    return SparsePose(shape, frame_mask, landmark_mask, values)
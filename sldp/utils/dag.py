@@ -0,0 +1,260 @@
+import asyncio
+import dataclasses
+import hashlib
+import importlib
+import inspect
+import json
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Optional
+
+
+@dataclasses.dataclass
+class StageSpec:
+    """
+    A stage of a pipeline, calling an existing function.
+
+    Attributes:
+        name: Unique name of the stage.
+        function: Function to call, as `module:function` (imported when the stage starts).
+        kwargs: Keyword arguments of the function.
+        inputs: Files or directories read by the stage.
+        outputs: Files or directories produced by the stage.
+        depends_on: Names of the stages that must finish before this one, in addition to
+            the stages producing its inputs.
+        cpu: Number of CPU slots used by the stage (e.g. its `n_jobs`). Default to 1.
+        io: Number of I/O slots used by the stage (downloads, large reads/writes). Default to 0.
+    """
+    name: str
+    function: str
+    kwargs: dict[str, Any] = dataclasses.field(default_factory=dict)
+    inputs: list[str] = dataclasses.field(default_factory=list)
+    outputs: list[str] = dataclasses.field(default_factory=list)
+    depends_on: list[str] = dataclasses.field(default_factory=list)
+    cpu: int = 1
+    io: int = 0
+
+
+@dataclasses.dataclass
+class StageTiming:
+    status: str = "pending"
+    waited_s: float = 0.0
+    duration_s: float = 0.0
+    error: Optional[str] = None
+
+
+class ResourceBudget:
+    """A global budget of CPU and I/O slots shared by the running stages."""
+
+    def __init__(self, max_cpu: int, max_io: int):
+        self.max_cpu = max_cpu
+        self.max_io = max_io
+        self.available_cpu = max_cpu
+        self.available_io = max_io
+        self.condition = threading.Condition()
+
+    def _clamp(self, cpu: int, io: int) -> tuple[int, int]:
+        return min(cpu, self.max_cpu), min(io, self.max_io)
+
+    def acquire(self, cpu: int, io: int):
+        cpu, io = self._clamp(cpu, io)
+        with self.condition:
+            self.condition.wait_for(lambda: self.available_cpu >= cpu and self.available_io >= io)
+            self.available_cpu -= cpu
+            self.available_io -= io
+
+    def release(self, cpu: int, io: int):
+        cpu, io = self._clamp(cpu, io)
+        with self.condition:
+            self.available_cpu += cpu
+            self.available_io += io
+            self.condition.notify_all()
+
+
+def _is_within(path: str, parent: str) -> bool:
+    path, parent = os.path.normpath(path), os.path.normpath(parent)
+    return path == parent or path.startswith(parent + os.sep)
+
+
+def resolve_dependencies(stages: list[StageSpec]) -> dict[str, set[str]]:
+    """
+    Returns the dependencies of each stage: the stages listed in `depends_on`, and the stages
+    with an output containing one of its inputs.
+
+    Raises:
+        ValueError: If a dependency is unknown or if the dependencies contain a cycle.
+    """
+    names = {stage.name for stage in stages}
+    if len(names) != len(stages):
+        raise ValueError("Stage names must be unique.")
+    dependencies = {}
+    for stage in stages:
+        unknown = set(stage.depends_on) - names
+        if unknown:
+            raise ValueError(f"Unknown dependencies of stage [{stage.name}]: {sorted(unknown)}.")
+        dependencies[stage.name] = set(stage.depends_on) | {
+            other.name
+            for other in stages
+            if other.name != stage.name
+            and any(_is_within(path, output) for path in stage.inputs for output in other.outputs)
+        }
+    visited, in_progress = set(), set()
+
+    def visit(name: str):
+        if name in in_progress:
+            raise ValueError(f"Cyclic dependency involving stage [{name}].")
+        if name in visited:
+            return
+        in_progress.add(name)
+        for dependency in dependencies[name]:
+            visit(dependency)
+        in_progress.remove(name)
+        visited.add(name)
+
+    for name in dependencies:
+        visit(name)
+    return dependencies
+
+
+def import_function(function_path: str) -> Callable:
+    module_name, function_name = function_path.split(":", 1)
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def _get_stamp_path(state_dir: str, stage: StageSpec) -> str:
+    return os.path.join(state_dir, f"{stage.name}.done")
+
+
+def _get_config_hash(stage: StageSpec) -> str:
+    """Returns a hash of the function and the arguments of a stage, stored in its completion stamp."""
+    config = json.dumps({"function": stage.function, "kwargs": stage.kwargs}, sort_keys=True, default=str)
+    return hashlib.sha256(config.encode("utf-8")).hexdigest()
+
+
+def _is_completed(state_dir: str, stage: StageSpec) -> bool:
+    """Checks that a stage completed with its current configuration, and that its outputs still exist."""
+    stamp_path = _get_stamp_path(state_dir, stage)
+    if not os.path.exists(stamp_path):
+        return False
+    with open(stamp_path) as f:
+        config_hash = f.readline().strip()
+    return config_hash == _get_config_hash(stage) and all(os.path.exists(path) for path in stage.outputs)
+
+
+def _run_stage(stage: StageSpec, budget: ResourceBudget, timing: StageTiming, state_dir: str, verbose: bool):
+    queued_at = time.perf_counter()
+    budget.acquire(stage.cpu, stage.io)
+    started_at = time.perf_counter()
+    timing.waited_s = started_at - queued_at
+    timing.status = "running"
+    if verbose:
+        print(f"[{stage.name}] started.")
+    stamp_path = _get_stamp_path(state_dir, stage)
+    try:
+        if os.path.exists(stamp_path):
+            os.remove(stamp_path)
+        function = import_function(stage.function)
+        result = function(**stage.kwargs)
+        if inspect.isawaitable(result):
+            result = asyncio.run(result)
+        # The stamp is only written once the stage succeeded, so that partial outputs are not seen as complete.
+        os.makedirs(state_dir, exist_ok=True)
+        with open(stamp_path, "w") as f:
+            f.write(f"{_get_config_hash(stage)}\n{time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+        timing.status = "done"
+        return result
+    except BaseException:
+        timing.status = "failed"
+        timing.error = traceback.format_exc()
+        raise
+    finally:
+        timing.duration_s = time.perf_counter() - started_at
+        budget.release(stage.cpu, stage.io)
+        if verbose:
+            print(f"[{stage.name}] {timing.status} in {timing.duration_s:.1f}s.")
+
+
+def run_dag(
+    stages: list[StageSpec],
+    max_cpu: int = os.cpu_count() or 1,
+    max_io: int = 4,
+    skip_completed: bool = True,
+    state_dir: str = ".sldp",
+    verbose: bool = True,
+) -> dict[str, StageTiming]:
+    """
+    Runs the stages of a pipeline as soon as their dependencies are done, concurrently,
+    within a global budget of CPU and I/O slots.
+
+    A stage whose dependencies failed is not run. Other stages keep running.
+
+    Args:
+        stages: Stages of the pipeline.
+        max_cpu: Number of CPU slots. Default to the number of CPUs.
+        max_io: Number of I/O slots. Default to 4.
+        skip_completed: Skip the stages that completed in a previous run with the same function and arguments,
+            whose outputs all exist, and whose dependencies were all skipped. Default to True.
+        state_dir: Directory of the completion stamps (`{stage}.done`), written when a stage succeeds.
+            Default to `.sldp`.
+        verbose: Print the start and the end of each stage. Default to True.
+
+    Returns:
+        The status and timings of each stage.
+    """
+    dependencies = resolve_dependencies(stages)
+    stages_by_name = {stage.name: stage for stage in stages}
+    timings = {stage.name: StageTiming() for stage in stages}
+    budget = ResourceBudget(max_cpu, max_io)
+    remaining = set(stages_by_name)
+    running: dict[Future, str] = {}
+
+    def is_finished(name: str) -> bool:
+        return timings[name].status in ("done", "skipped")
+
+    def has_failed(name: str) -> bool:
+        return timings[name].status in ("failed", "cancelled")
+
+    with ThreadPoolExecutor(max_workers=max(len(stages), 1)) as executor:
+        while remaining or running:
+            for name in sorted(remaining):
+                stage = stages_by_name[name]
+                if any(has_failed(dependency) for dependency in dependencies[name]):
+                    timings[name].status = "cancelled"
+                    remaining.remove(name)
+                    if verbose:
+                        print(f"[{name}] cancelled, a dependency failed.")
+                elif all(is_finished(dependency) for dependency in dependencies[name]):
+                    remaining.remove(name)
+                    # A stage is run again if one of its dependencies ran, as its outputs may be stale.
+                    if (
+                        skip_completed
+                        and not any(timings[dependency].status == "done" for dependency in dependencies[name])
+                        and _is_completed(state_dir, stage)
+                    ):
+                        timings[name].status = "skipped"
+                        if verbose:
+                            print(f"[{name}] skipped, already completed.")
+                        continue
+                    timings[name].status = "queued"
+                    running[executor.submit(_run_stage, stage, budget, timings[name], state_dir, verbose)] = name
+            if not running:
+                if remaining:
+                    # Skipped or cancelled stages may have unblocked others.
+                    continue
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                if future.exception() is not None and verbose:
+                    print(f"[{name}] failed:\n{timings[name].error}")
+    return timings
+
+
+def format_timings(timings: dict[str, StageTiming]) -> str:
+    lines = [f"{'stage':<32} {'status':<10} {'waited':>10} {'duration':>10}"]
+    for name, timing in timings.items():
+        lines.append(f"{name:<32} {timing.status:<10} {timing.waited_s:>9.1f}s {timing.duration_s:>9.1f}s")
+    return "\n".join(lines)
@@ -1,12 +1,109 @@
+import email.utils
+import math
+import os
 import pathlib
 import asyncio
-from typing import List, Tuple
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 
 import httpx
 import aiofiles
 from tqdm import tqdm
 
 
+MIN_RANGE_SIZE = 8 * 1024**2
+MAX_RANGE_SIZE = 128 * 1024**2
+# Number of ranges per connection, so that connections finishing early take the remaining ranges.
+RANGES_PER_CONNECTION = 4
+# Status codes of the responses asking to slow down, retried without using up the retries of a file.
+THROTTLING_STATUS_CODES = (429, 503)
+
+
+def _parse_retry_after(response: httpx.Response) -> Optional[float]:
+    """Returns the delay of the Retry-After header of a response (in seconds or as an HTTP date), if any."""
+    retry_after = response.headers.get("Retry-After")
+    if retry_after is None:
+        return None
+    retry_after = retry_after.strip()
+    if retry_after.isdigit():
+        return float(retry_after)
+    try:
+        retry_date = email.utils.parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_date.timestamp() - time.time())
+
+
+class _HostThrottle:
+    """
+    Adaptive backoff shared by all the requests to a host.
+
+    When the host throttles a request (429, 503), no request is sent to the host until the delay
+    of its Retry-After header, or else an exponential backoff, has elapsed. The backoff doubles
+    with each throttled request, and is halved by each successful request.
+
+    Requests are also spaced by an interval that doubles with each throttled request and shrinks
+    with each successful one, so that the waiting requests do not all hit the host again at the end
+    of the delay, and the request rate converges to what the host accepts.
+    """
+
+    def __init__(
+            self,
+            initial_backoff: float = 1.0,
+            max_backoff: float = 60.0,
+            min_interval: float = 0.05,
+            max_interval: float = 10.0,
+    ):
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = initial_backoff
+        self.interval = 0.0
+        self.blocked_until = 0.0
+        self.next_request_at = 0.0
+
+    async def wait(self):
+        loop = asyncio.get_running_loop()
+        while (delay := max(self.blocked_until, self.next_request_at) - loop.time()) > 0:
+            await asyncio.sleep(delay)
+        self.next_request_at = loop.time() + self.interval
+
+    def throttle(self, retry_after: Optional[float]) -> float:
+        """
+        Blocks the host after a throttled request, and returns the delay.
+        The delay is at least the request interval, even with a `Retry-After: 0` header.
+        """
+        self.interval = min(max(self.interval * 2, self.min_interval), self.max_interval)
+        if retry_after is None:
+            delay = self.backoff
+            self.backoff = min(self.backoff * 2, self.max_backoff)
+        else:
+            delay = min(max(retry_after, self.interval), self.max_backoff)
+        self.blocked_until = max(self.blocked_until, asyncio.get_running_loop().time() + delay)
+        return delay
+
+    def success(self):
+        self.backoff = max(self.backoff / 2, self.initial_backoff)
+        self.interval = self.interval * 0.9 if self.interval > self.min_interval / 4 else 0.0
+
+
+class _HostThrottles:
+    def __init__(self):
+        self.throttles: Dict[str, _HostThrottle] = {}
+
+    def get(self, url: str) -> _HostThrottle:
+        host = httpx.URL(url).host
+        if host not in self.throttles:
+            self.throttles[host] = _HostThrottle()
+        return self.throttles[host]
+
+
+def _is_throttled(error: Exception) -> bool:
+    return isinstance(error, httpx.HTTPStatusError) and error.response.status_code in THROTTLING_STATUS_CODES
+
+
 async def _download_file_async(
     url: str,
     dest_filepath: str,
@@ -14,37 +111,217 @@ async def _download_file_async(
     semaphore: asyncio.Semaphore,
     max_retries: int,
     verbose: bool,
+    on_complete: Optional[Callable[[str, bool], Awaitable[None]]] = None,
+    min_ranged_size: int = 64 * 1024**2,
+    max_connections_per_file: int = 8,
+    throttles: Optional[_HostThrottles] = None,
+    max_throttle_wait: float = 600.0,
 ) -> Tuple[str, bool]:
     """
     The core download logic, running one task within the semaphore.
     This is fully asynchronous, using httpx for requests and aiofiles for disk I/O.
     """
     async with semaphore:
-        if verbose:
-            print(f"Starting download for {url}")
-        for attempt in range(max_retries):
-            try:
-                pathlib.Path(dest_filepath).parent.mkdir(parents=True, exist_ok=True)
-                async with client.stream(
-                    "GET", url, timeout=30, follow_redirects=True
-                ) as response:
-                    response.raise_for_status()
-                    async with aiofiles.open(dest_filepath, "wb") as f:
-                        async for chunk in response.aiter_bytes(chunk_size=8192):
+        result = await _download_file_with_retries(
+            url, dest_filepath, client, max_retries, verbose, semaphore, min_ranged_size, max_connections_per_file,
+            throttles, max_throttle_wait,
+        )
+        if on_complete is not None:
+            # Called while holding the semaphore, so that a slow consumer also slows down the downloads.
+            await on_complete(*result)
+        return result
+
+
+def _get_ranged_download_info(response: httpx.Response, min_ranged_size: int) -> Optional[Tuple[int, Optional[str]]]:
+    """
+    Returns the size and the validator (ETag or Last-Modified) of a file if it is large enough
+    to be downloaded by ranges and the server accepts range requests, None otherwise.
+    """
+    if response.headers.get("Accept-Ranges", "").lower() != "bytes":
+        return None
+    size = response.headers.get("Content-Length")
+    if size is None or not size.isdigit() or int(size) < min_ranged_size:
+        return None
+    if response.headers.get("Content-Encoding", "identity") != "identity":
+        return None
+    return int(size), response.headers.get("ETag") or response.headers.get("Last-Modified")
+
+
+def _split_into_ranges(size: int, n_connections: int) -> List[Tuple[int, int]]:
+    range_size = math.ceil(size / (n_connections * RANGES_PER_CONNECTION))
+    range_size = min(max(range_size, MIN_RANGE_SIZE), MAX_RANGE_SIZE)
+    return [(start, min(start + range_size, size)) for start in range(0, size, range_size)]
+
+
+async def _download_file_ranges(
+    url: str,
+    dest_filepath: str,
+    size: int,
+    validator: Optional[str],
+    client: httpx.AsyncClient,
+    semaphore: asyncio.Semaphore,
+    max_connections: int,
+    max_retries: int,
+    verbose: bool,
+    throttle: _HostThrottle,
+    max_throttle_wait: float,
+) -> bool:
+    """
+    Downloads a file with parallel range requests into a preallocated `.part` file,
+    renamed to `dest_filepath` once all the ranges are downloaded.
+
+    The file is split into about `RANGES_PER_CONNECTION` ranges per connection, that connections
+    take from a shared queue. Besides the download slot of the file, one connection is opened
+    per free slot of the semaphore, up to `max_connections`. Each range is retried separately,
+    resuming from its last downloaded byte. Throttled requests wait for the host (see `_HostThrottle`)
+    and are retried without using up the retries of the range, until `max_throttle_wait` seconds have elapsed
+    since the first throttled response without any range being downloaded.
+    """
+    part_filepath = f"{dest_filepath}.part"
+    with open(part_filepath, "wb") as f:
+        f.truncate(size)
+    ranges = deque((start, end, 0) for start, end in _split_into_ranges(size, max_connections))
+    failed = False
+    loop = asyncio.get_running_loop()
+    throttled_since = None
+
+    async def download_ranges():
+        nonlocal failed, throttled_since
+        async with aiofiles.open(part_filepath, "r+b") as f:
+            while ranges and not failed:
+                start, end, attempt = ranges.popleft()
+                await throttle.wait()
+                position = start
+                headers = {"Range": f"bytes={start}-{end - 1}"}
+                if validator is not None:
+                    headers["If-Range"] = validator
+                try:
+                    async with client.stream("GET", url, headers=headers, timeout=30) as response:
+                        response.raise_for_status()
+                        if response.status_code != 206:
+                            # The file changed on the server, or ranges are not supported anymore.
+                            raise httpx.HTTPStatusError(
+                                f"Expected a partial response, got {response.status_code}.",
+                                request=response.request,
+                                response=response,
+                            )
+                        await f.seek(position)
+                        async for chunk in response.aiter_bytes(chunk_size=1024**2):
+                            chunk = chunk[:end - position]
                             await f.write(chunk)
+                            position += len(chunk)
+                    if position < end:
+                        raise httpx.RemoteProtocolError(f"Range ended at byte {position} instead of {end}.")
+                    throttle.success()
+                    throttled_since = None
+                except (httpx.RequestError, httpx.HTTPStatusError) as e:
+                    if throttled_since is None and _is_throttled(e):
+                        throttled_since = loop.time()
+                    if _is_throttled(e) and loop.time() - throttled_since < max_throttle_wait:
+                        throttle.throttle(_parse_retry_after(e.response))
+                        if verbose:
+                            print(f"Range {start}-{end - 1} THROTTLED ({e.response.status_code}) for {url}.")
+                        ranges.append((position, end, attempt))
+                        continue
+                    print(f"Range {start}-{end - 1} attempt {attempt + 1}/{max_retries} FAILED for {url}: {e}")
+                    if attempt >= max_retries - 1:
+                        failed = True
+                        return
+                    await asyncio.sleep(2**attempt)
+                    # A range that made progress before failing does not use up its retries.
+                    ranges.append((position, end, 0 if position > start else attempt + 1))
+
+    n_extra_connections = 0
+    while n_extra_connections + 1 < min(max_connections, len(ranges)) and not semaphore.locked():
+        await semaphore.acquire()
+        n_extra_connections += 1
+    if verbose:
+        print(f"Downloading {url} ({size} bytes) in {len(ranges)} ranges with {n_extra_connections + 1} connections.")
+    try:
+        await asyncio.gather(*(download_ranges() for _ in range(n_extra_connections + 1)))
+    finally:
+        for _ in range(n_extra_connections):
+            semaphore.release()
+    if failed:
+        os.remove(part_filepath)
+        return False
+    os.replace(part_filepath, dest_filepath)
+    return True
+
+
+async def _download_file_with_retries(
+    url: str,
+    dest_filepath: str,
+    client: httpx.AsyncClient,
+    max_retries: int,
+    verbose: bool,
+    semaphore: Optional[asyncio.Semaphore] = None,
+    min_ranged_size: int = 64 * 1024**2,
+    max_connections_per_file: int = 1,
+    throttles: Optional[_HostThrottles] = None,
+    max_throttle_wait: float = 600.0,
+) -> Tuple[str, bool]:
+    if verbose:
+        print(f"Starting download for {url}")
+    throttle = (throttles or _HostThrottles()).get(url)
+    attempt = 0
+    loop = asyncio.get_running_loop()
+    throttled_since = None
+    while attempt < max_retries:
+        await throttle.wait()
+        try:
+            pathlib.Path(dest_filepath).parent.mkdir(parents=True, exist_ok=True)
+            async with client.stream(
+                "GET", url, timeout=30, follow_redirects=True
+            ) as response:
+                response.raise_for_status()
+                ranged_download_info = None
+                if max_connections_per_file > 1 and semaphore is not None:
+                    ranged_download_info = _get_ranged_download_info(response, min_ranged_size)
+                if ranged_download_info is None:
+                    # Written to a `.part` file renamed once complete, so that an existing file is never truncated.
+                    part_filepath = f"{dest_filepath}.part"
+                    try:
+                        async with aiofiles.open(part_filepath, "wb") as f:
+                            async for chunk in response.aiter_bytes(chunk_size=8192):
+                                await f.write(chunk)
+                    except BaseException:
+                        if os.path.exists(part_filepath):
+                            os.remove(part_filepath)
+                        raise
+                    os.replace(part_filepath, dest_filepath)
+                    throttle.success()
                     if verbose:
                         print(f"SUCCESS: {url} -> {dest_filepath}")
                     return dest_filepath, True  # Success
-            except (httpx.RequestError, httpx.HTTPStatusError) as e:
-                print(f"Attempt {attempt + 1}/{max_retries} FAILED for {url}: {e}")
-                if attempt < max_retries - 1:
-                    # Exponential backoff: 1s, 2s, 4s...
-                    await asyncio.sleep(2**attempt)
-                else:
-                    if verbose:
-                        print(f"PERMA-FAIL: {url} after {max_retries} attempts.")
-                    return dest_filepath, False  # Final failure
-    return dest_filepath, False  # Should be unreachable
+                final_url = str(response.url)
+            throttle.success()
+            # The first response is closed, and the file is downloaded by ranges (retried separately).
+            size, validator = ranged_download_info
+            success = await _download_file_ranges(
+                final_url, dest_filepath, size, validator, client, semaphore,
+                max_connections_per_file, max_retries, verbose, throttle, max_throttle_wait,
+            )
+            if verbose:
+                print(f"{'SUCCESS' if success else 'PERMA-FAIL'}: {url} -> {dest_filepath}")
+            return dest_filepath, success
+        except (httpx.RequestError, httpx.HTTPStatusError) as e:
+            if throttled_since is None and _is_throttled(e):
+                throttled_since = loop.time()
+            if _is_throttled(e) and loop.time() - throttled_since < max_throttle_wait:
+                # The server asks to slow down: wait for the host, without using up a retry.
+                delay = throttle.throttle(_parse_retry_after(e.response))
+                if verbose:
+                    print(f"THROTTLED ({e.response.status_code}) for {url}, host paused for {delay:.1f}s.")
+                continue
+            print(f"Attempt {attempt + 1}/{max_retries} FAILED for {url}: {e}")
+            attempt += 1
+            if attempt < max_retries:
+                # Exponential backoff: 1s, 2s, 4s...
+                await asyncio.sleep(2**(attempt - 1))
+    if verbose:
+        print(f"PERMA-FAIL: {url} after {max_retries} attempts.")
+    return dest_filepath, False  # Final failure
 
 
 async def download_files(
@@ -54,6 +331,10 @@ async def download_files(
     max_retries: int = 3,
     verbose: bool = False,
     skip_existing: bool = True,
+    on_complete: Optional[Callable[[str, bool], Awaitable[None]]] = None,
+    min_ranged_size: int = 64 * 1024**2,
+    max_connections_per_file: int = 8,
+    max_throttle_wait: float = 600.0,
 ) -> List[Tuple[str, bool]]:
     """
     Downloads a batch of files concurrently with rate limiting and retries
@@ -63,9 +344,20 @@ async def download_files(
         files_to_download: A list of (source_url, dest_filepath) tuples.
         max_concurrent: Max number of files to download at the same time.
         max_rps: Max number of new requests to start per second.
-        max_retries: Max number of retries for each failed download.
+        max_retries: Max number of retries for each failed download (throttled requests excepted).
         verbose: Show information about downloaded files. Default to False.
         skip_existing: Skip existing files. Default to True. Otherwise, redownload them.
+        on_complete: Coroutine function awaited with (dest_filepath, success) as soon as each download ends,
+            e.g. to feed the downloaded files to another processing stage. The download slot is held until
+            it returns, which limits the number of downloaded files waiting to be processed. Default to None.
+        min_ranged_size: Files of at least this size, in bytes, are downloaded with parallel range requests
+            if the server accepts them (`Accept-Ranges: bytes`). Default to 64 MiB.
+        max_connections_per_file: Max number of connections of a ranged download. Besides the download slot
+            of the file, only the free slots of `max_concurrent` are used. Default to 8 (1 to disable ranged downloads).
+        max_throttle_wait: Max time, in seconds, that a file waits for a host that throttles it
+            (429 or 503 responses, honouring their Retry-After header), from its first throttled response.
+            These responses pause all the requests to the host, and do not use up the retries of the file
+            until this time has elapsed. Default to 600.
 
     Returns:
         A list of (dest_filepath, success_boolean) tuples.
@@ -76,6 +368,7 @@ async def download_files(
             f"Config: {max_concurrent} concurrent, {max_rps} RPS, {max_retries} retries."
         )
     semaphore = asyncio.Semaphore(max_concurrent)
+    throttles = _HostThrottles()
     delay_between_requests = 1.0 / max_rps
     tasks = []
     async with httpx.AsyncClient() as client:
@@ -85,7 +378,10 @@ async def download_files(
                     print(f"Skipping {dest_filepath}. File already exists.")
                 continue
             task = asyncio.create_task(
-                _download_file_async(url, dest_filepath, client, semaphore, max_retries, verbose)
+                _download_file_async(
+                    url, dest_filepath, client, semaphore, max_retries, verbose, on_complete,
+                    min_ranged_size, max_connections_per_file, throttles, max_throttle_wait,
+                )
             )
             tasks.append(task)
             await asyncio.sleep(delay_between_requests)
@@ -0,0 +1,111 @@
+import asyncio
+import dataclasses
+import os
+import tempfile
+import time
+from typing import Optional
+
+from sldp.utils.download import download_files
+from sldp.utils.http_test_server import LocalTestServer, ServerBehavior
+
+
+@dataclasses.dataclass
+class BenchmarkScenario:
+    name: str
+    behavior: ServerBehavior
+    n_files: int = 20
+    file_size: int = 1024**2
+    download_kwargs: dict = dataclasses.field(default_factory=dict)
+
+
+DEFAULT_SCENARIOS = [
+    BenchmarkScenario("baseline", ServerBehavior()),
+    BenchmarkScenario("latency-bandwidth", ServerBehavior(latency_s=0.1, bandwidth=4 * 1024**2)),
+    BenchmarkScenario("rate-limited", ServerBehavior(max_rps=4, retry_after_s=1), download_kwargs=dict(max_rps=20)),
+    BenchmarkScenario("unavailable", ServerBehavior(unavailable_probability=0.3, retry_after_s=1)),
+    BenchmarkScenario("throttled-no-retry-after", ServerBehavior(max_rps=4, retry_after_s=None), download_kwargs=dict(max_rps=20)),
+    # The host never recovers and asks to retry immediately: downloads must give up after `max_throttle_wait`.
+    BenchmarkScenario(
+        "unavailable-retry-after-0",
+        ServerBehavior(unavailable_probability=1, retry_after_s=0),
+        n_files=2,
+        download_kwargs=dict(max_throttle_wait=2.0, max_retries=2),
+    ),
+    BenchmarkScenario("disconnects", ServerBehavior(disconnect_probability=0.2), download_kwargs=dict(max_retries=5)),
+    BenchmarkScenario(
+        "large-file-single-connection",
+        ServerBehavior(bandwidth=8 * 1024**2),
+        n_files=1,
+        file_size=128 * 1024**2,
+        download_kwargs=dict(max_connections_per_file=1),
+    ),
+    BenchmarkScenario(
+        "large-file-ranged",
+        ServerBehavior(bandwidth=8 * 1024**2, disconnect_probability=0.1),
+        n_files=1,
+        file_size=128 * 1024**2,
+        download_kwargs=dict(min_ranged_size=64 * 1024**2, max_connections_per_file=8),
+    ),
+]
+
+
+def run_download_benchmark(scenario: BenchmarkScenario, dest_dir: Optional[str] = None) -> dict:
+    """
+    Downloads the files of a scenario from a `LocalTestServer` with `download_files`,
+    checks their contents, and reports the throughput and the retry behavior.
+
+    Args:
+        scenario: Simulated server conditions, files and arguments of `download_files`.
+        dest_dir: Directory of the downloaded files. Default to a temporary directory.
+
+    Returns:
+        The report of the scenario: number of files (downloaded and valid), duration, throughput in MiB/s,
+        and the counters of the server (requests, throttled requests, early retries, disconnects, ...).
+    """
+    files = {f"file_{idx:0>4}.bin": os.urandom(scenario.file_size) for idx in range(scenario.n_files)}
+    with tempfile.TemporaryDirectory(dir=dest_dir) as tmp_dir, LocalTestServer(files, scenario.behavior) as server:
+        files_to_download = [(server.get_url(name), os.path.join(tmp_dir, name)) for name in files]
+        started_at = time.perf_counter()
+        results = asyncio.run(download_files(files_to_download, **scenario.download_kwargs))
+        duration_s = time.perf_counter() - started_at
+        n_valid = 0
+        for (name, data), (dest_filepath, success) in zip(files.items(), results):
+            if success:
+                with open(dest_filepath, "rb") as f:
+                    n_valid += f.read() == data
+        stats = dataclasses.asdict(server.stats)
+    n_bytes = sum(len(data) for data in files.values())
+    return {
+        "scenario": scenario.name,
+        "files": scenario.n_files,
+        "downloaded": sum(success for _, success in results),
+        "valid": n_valid,
+        "duration_s": duration_s,
+        "throughput_mib_s": n_bytes / 1024**2 / duration_s,
+        **stats,
+    }
+
+
+def format_benchmark_reports(reports: list[dict]) -> str:
+    columns = [
+        ("scenario", 30), ("valid", 6), ("files", 6), ("duration_s", 11), ("throughput_mib_s", 17),
+        ("requests", 9), ("range_requests", 15), ("throttled", 10), ("unavailable", 12),
+        ("early_retries", 14), ("disconnected", 13),
+    ]
+    lines = [" ".join(f"{name:>{width}}" if name != "scenario" else f"{name:<{width}}" for name, width in columns)]
+    for report in reports:
+        cells = []
+        for name, width in columns:
+            value = report[name]
+            if name == "scenario":
+                cells.append(f"{value:<{width}}")
+            elif isinstance(value, float):
+                cells.append(f"{value:>{width}.2f}")
+            else:
+                cells.append(f"{value:>{width}}")
+        lines.append(" ".join(cells))
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    print(format_benchmark_reports([run_download_benchmark(scenario) for scenario in DEFAULT_SCENARIOS]))
@@ -0,0 +1,216 @@
+import dataclasses
+import http.server
+import math
+import random
+import re
+import threading
+import time
+from typing import Optional
+
+
+@dataclasses.dataclass
+class ServerBehavior:
+    """
+    Simulated conditions of a `LocalTestServer`.
+
+    Attributes:
+        latency_s: Delay before each response. Default to 0.
+        bandwidth: Max throughput of each response, in bytes per second. Default to None (no limit).
+        max_rps: Max number of requests per second, above which requests get a 429 response. Default to None.
+        unavailable_probability: Probability of a 503 response. Default to 0.
+        retry_after_s: Delay of the Retry-After header of the 429 and 503 responses. None to omit the header.
+            Default to 1.
+        disconnect_probability: Probability of closing the connection in the middle of a response body. Default to 0.
+        support_ranges: Accept range requests. Default to True.
+        seed: Seed of the random failures. Default to 0.
+    """
+    latency_s: float = 0.0
+    bandwidth: Optional[float] = None
+    max_rps: Optional[float] = None
+    unavailable_probability: float = 0.0
+    retry_after_s: Optional[float] = 1.0
+    disconnect_probability: float = 0.0
+    support_ranges: bool = True
+    seed: int = 0
+
+
+@dataclasses.dataclass
+class ServerStats:
+    """Counters of a `LocalTestServer`. `early_retries` counts the requests received before the end of a Retry-After delay."""
+    requests: int = 0
+    range_requests: int = 0
+    throttled: int = 0
+    unavailable: int = 0
+    disconnected: int = 0
+    early_retries: int = 0
+    bytes_sent: int = 0
+
+
+class _RequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_HTTPServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_throttled(self, status: int):
+        self.send_response(status)
+        if self.server.behavior.retry_after_s is not None:
+            self.send_header("Retry-After", str(math.ceil(self.server.behavior.retry_after_s)))
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _send_body(self, body: memoryview) -> bool:
+        behavior = self.server.behavior
+        disconnect_at = None
+        if self.server.draw(behavior.disconnect_probability):
+            disconnect_at = self.server.random_int(len(body))
+        chunk_size = 64 * 1024
+        position = 0
+        while position < len(body):
+            end = min(position + chunk_size, len(body))
+            if disconnect_at is not None and end > disconnect_at:
+                self.wfile.write(body[position:disconnect_at])
+                self.server.update_stats(disconnected=1, bytes_sent=disconnect_at - position)
+                self.close_connection = True
+                return False
+            started_at = time.perf_counter()
+            self.wfile.write(body[position:end])
+            self.server.update_stats(bytes_sent=end - position)
+            if behavior.bandwidth is not None:
+                time.sleep(max(0.0, (end - position) / behavior.bandwidth - (time.perf_counter() - started_at)))
+            position = end
+        return True
+
+    def do_GET(self):
+        behavior = self.server.behavior
+        range_header = self.headers.get("Range") if behavior.support_ranges else None
+        self.server.update_stats(requests=1, range_requests=int(range_header is not None))
+        received_at = time.monotonic()
+        if behavior.latency_s > 0:
+            time.sleep(behavior.latency_s)
+        status = self.server.check_throttling(self.client_address[0], received_at)
+        if status is not None:
+            self._send_throttled(status)
+            return
+        data = self.server.files.get(self.path.lstrip("/"))
+        if data is None:
+            self.send_error(404)
+            return
+        body = memoryview(data)
+        match = re.fullmatch(r"bytes=(\d+)-(\d*)", range_header or "")
+        if match is not None and int(match[1]) < len(data):
+            start = int(match[1])
+            end = min(int(match[2]) + 1 if match[2] else len(data), len(data))
+            body = body[start:end]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end - 1}/{len(data)}")
+        else:
+            self.send_response(200)
+        if behavior.support_ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", f'"{len(data)}"')
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self._send_body(body)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+
+class _HTTPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, files: dict[str, bytes], behavior: ServerBehavior):
+        super().__init__(address, _RequestHandler)
+        self.files = files
+        self.behavior = behavior
+        self.stats = ServerStats()
+        self.lock = threading.Lock()
+        self.random = random.Random(behavior.seed)
+        self.request_times = []
+        self.blocked_until = {}
+
+    def update_stats(self, **increments):
+        with self.lock:
+            for name, increment in increments.items():
+                setattr(self.stats, name, getattr(self.stats, name) + increment)
+
+    def draw(self, probability: float) -> bool:
+        with self.lock:
+            return self.random.random() < probability
+
+    def random_int(self, n: int) -> int:
+        with self.lock:
+            return self.random.randrange(max(n, 1))
+
+    def check_throttling(self, client: str, received_at: float) -> Optional[int]:
+        """Returns the status of a throttled request (429 or 503), None if the request is accepted."""
+        behavior = self.behavior
+        with self.lock:
+            now = time.monotonic()
+            if received_at < self.blocked_until.get(client, 0.0):
+                # The request was received before the end of the delay of the last Retry-After header.
+                self.stats.early_retries += 1
+            status = None
+            if behavior.max_rps is not None:
+                self.request_times = [t for t in self.request_times if t > now - 1.0]
+                if len(self.request_times) >= behavior.max_rps:
+                    status = 429
+                else:
+                    self.request_times.append(now)
+            if status is None and self.random.random() < behavior.unavailable_probability:
+                status = 503
+            if status is None:
+                return None
+            self.stats.throttled += status == 429
+            self.stats.unavailable += status == 503
+            if behavior.retry_after_s is not None:
+                self.blocked_until[client] = max(self.blocked_until.get(client, 0.0), now + behavior.retry_after_s)
+            return status
+
+
+class LocalTestServer:
+    """
+    Local HTTP server serving files from memory under simulated network conditions (latency,
+    bandwidth cap, rate limiting, unavailability, mid-stream disconnects, range requests),
+    to measure the behavior of `download_files` without real servers.
+
+    Example:
+        >>> with LocalTestServer({"video.mp4": data}, ServerBehavior(max_rps=5)) as server:
+        ...     asyncio.run(download_files([(server.get_url("video.mp4"), "video.mp4")]))
+        ...     server.stats.throttled
+
+    Args:
+        files: Contents of the served files, by path.
+        behavior: Simulated conditions. Default to no latency or failure.
+        port: Port of the server. Default to a free port.
+    """
+
+    def __init__(self, files: dict[str, bytes], behavior: Optional[ServerBehavior] = None, port: int = 0):
+        self.server = _HTTPServer(("127.0.0.1", port), files, behavior or ServerBehavior())
+        self.thread = None
+
+    @property
+    def stats(self) -> ServerStats:
+        return self.server.stats
+
+    def get_url(self, path: str) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/{path}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def __enter__(self) -> "LocalTestServer":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
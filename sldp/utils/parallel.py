@@ -1,8 +1,64 @@
+import threading
+from concurrent.futures import Executor
 from joblib import Parallel, delayed
-from typing import Callable, List, Dict, Any
+from joblib.externals.loky import ProcessPoolExecutor
+from typing import Callable, List, Dict, Any, Optional, Tuple
 
 
-def run_parallel(func: Callable, kwargs_list: List[Dict[str, Any]], n_jobs: int) -> List[Any]:
+# Persistent pools by (n_jobs, initializer, initargs). They are separate from the global reusable
+# executor of joblib, which `Parallel(backend="loky")` re-creates with its own settings.
+_worker_pools: Dict[Tuple, ProcessPoolExecutor] = {}
+_worker_pools_lock = threading.Lock()
+
+
+def get_worker_pool(
+        n_jobs: int,
+        initializer: Optional[Callable] = None,
+        initargs: Tuple = (),
+        idle_timeout: int = 300,
+) -> Executor:
+    """
+    Returns a persistent pool of worker processes (loky executor), shared by the calls
+    with the same number of jobs and initializer.
+
+    Workers are kept alive between calls (until they are idle for `idle_timeout` seconds),
+    so that imports and expensive initializations (e.g. loading models in `initializer`)
+    are done once per process instead of once per task or batch.
+
+    Args:
+        n_jobs: The number of worker processes.
+        initializer: Function called once in each worker process when it starts. Default to None.
+        initargs: Arguments of the initializer.
+        idle_timeout: Number of seconds after which idle workers are stopped. Default to 300.
+
+    Returns:
+        A `concurrent.futures.Executor`.
+    """
+    key = (n_jobs, initializer, tuple(initargs))
+    with _worker_pools_lock:
+        executor = _worker_pools.get(key)
+        if executor is None or executor._flags.shutdown or executor._flags.broken:
+            executor = ProcessPoolExecutor(
+                max_workers=n_jobs,
+                timeout=idle_timeout,
+                initializer=initializer,
+                initargs=initargs,
+            )
+            _worker_pools[key] = executor
+        return executor
+
+
+def _call_with_kwargs(func: Callable, kwargs: Dict[str, Any]) -> Any:
+    return func(**kwargs)
+
+
+def run_parallel(
+        func: Callable,
+        kwargs_list: List[Dict[str, Any]],
+        n_jobs: int,
+        initializer: Optional[Callable] = None,
+        initargs: Tuple = (),
+) -> List[Any]:
     """
     Launches a function in parallel with different sets of keyword arguments using processes (with joblib).
 
@@ -11,15 +67,23 @@ def run_parallel(func: Callable, kwargs_list: List[Dict[str, Any]], n_jobs: int)
         kwargs_list: A list of dictionaries, where each dictionary contains
                        the keyword arguments for a single call to `func`.
         n_jobs: The number of parallel processes to use.
+        initializer: Function called once in each worker process. If given, the tasks run
+                       in the persistent pool of `get_worker_pool`. Default to None.
+        initargs: Arguments of the initializer.
 
     Returns:
         A list containing the return values from each function call,
         in the same order as the input `kwargs_list`.
     """
     print(f"Starting parallel execution of '{func.__name__}' with {len(kwargs_list)} tasks on {n_jobs} processes...")
-    # Ensures process-based parallelism, which is truly parallel and avoids GIL issues.
-    results = Parallel(n_jobs=n_jobs, backend="loky")(
-        delayed(func)(**kwargs) for kwargs in kwargs_list
-    )
+    if initializer is not None:
+        executor = get_worker_pool(n_jobs, initializer=initializer, initargs=initargs)
+        futures = [executor.submit(_call_with_kwargs, func, kwargs) for kwargs in kwargs_list]
+        results = [future.result() for future in futures]
+    else:
+        # Ensures process-based parallelism, which is truly parallel and avoids GIL issues.
+        results = Parallel(n_jobs=n_jobs, backend="loky")(
+            delayed(func)(**kwargs) for kwargs in kwargs_list
+        )
     print("Parallel execution finished.")
-    return results
\ No newline at end of file
+    return results
@@ -0,0 +1,169 @@
+import dataclasses
+import queue
+import threading
+from typing import Any, Callable, Iterable, Optional
+
+from joblib.externals.loky import ProcessPoolExecutor
+
+
+_END = object()
+
+
+@dataclasses.dataclass(frozen=True)
+class Stage:
+    """
+    A processing stage of a pipeline.
+
+    Attributes:
+        name: Name of the stage, used in error messages.
+        func: Function applied to each item coming from the previous stage.
+            Items for which the function returns `None` are dropped.
+        n_workers: Number of threads (or processes) running the stage.
+        queue_size: Max number of items waiting in front of the stage.
+            When the queue is full, the previous stage blocks (backpressure).
+        executor: `thread` or `process`. Threads only overlap I/O and code releasing the GIL
+            (e.g. compression, most numpy operations). CPU-bound Python code (e.g. JSON decoding)
+            needs `process`, where `func`, its items and its results are pickled to worker processes.
+            Default to `thread`.
+    """
+    name: str
+    func: Callable[[Any], Any]
+    n_workers: int = 1
+    queue_size: int = 8
+    executor: str = "thread"
+
+
+class _PipelineAborted(Exception):
+    pass
+
+
+def _put(q: queue.Queue, item, stop_event: threading.Event):
+    while True:
+        if stop_event.is_set():
+            raise _PipelineAborted()
+        try:
+            q.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+
+
+def _get(q: queue.Queue, stop_event: threading.Event):
+    while True:
+        if stop_event.is_set():
+            raise _PipelineAborted()
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+
+
+def run_pipeline(
+    source: Iterable,
+    stages: list[Stage],
+    sink: Optional[Callable[[Any], None]] = None,
+):
+    """
+    Runs a staged pipeline where every stage runs in its own pool of threads,
+    or of processes for the stages with `executor="process"`.
+
+    Stages are connected by bounded queues, so that reading, processing and writing overlap
+    and the throughput of the whole pipeline is limited by its slowest stage.
+    The source iterator is consumed in its own thread, and the sink is called from the calling thread.
+
+    The order of items is only preserved if every stage uses a single worker.
+
+    Args:
+        source: Iterable of items fed into the first stage.
+        stages: List of stages, applied one after another.
+        sink: Function called with each item coming out of the last stage. Default to None.
+
+    Raises:
+        The first exception raised by the source, a stage or the sink.
+    """
+    queues = [queue.Queue(maxsize=stage.queue_size) for stage in stages]
+    output_queue = queue.Queue(maxsize=stages[-1].queue_size if stages else 8)
+    queues.append(output_queue)
+    stop_event = threading.Event()
+    errors = []
+
+    def fail(err: BaseException):
+        errors.append(err)
+        stop_event.set()
+
+    def read_source():
+        try:
+            for item in source:
+                _put(queues[0], item, stop_event)
+            for _ in range(stages[0].n_workers if stages else 1):
+                _put(queues[0], _END, stop_event)
+        except _PipelineAborted:
+            pass
+        except BaseException as err:
+            fail(err)
+
+    def run_stage(stage_idx: int, remaining_workers: list[int], lock: threading.Lock):
+        stage = stages[stage_idx]
+        process_pool = process_pools.get(stage_idx)
+        input_queue, next_queue = queues[stage_idx], queues[stage_idx + 1]
+        n_next_workers = stages[stage_idx + 1].n_workers if stage_idx + 1 < len(stages) else 1
+        try:
+            while True:
+                item = _get(input_queue, stop_event)
+                if item is _END:
+                    break
+                if process_pool is None:
+                    result = stage.func(item)
+                else:
+                    result = process_pool.submit(stage.func, item).result()
+                if result is not None:
+                    _put(next_queue, result, stop_event)
+            with lock:
+                remaining_workers[0] -= 1
+                is_last_worker = remaining_workers[0] == 0
+            if is_last_worker:
+                for _ in range(n_next_workers):
+                    _put(next_queue, _END, stop_event)
+        except _PipelineAborted:
+            pass
+        except BaseException as err:
+            err.add_note(f"Raised in pipeline stage [{stage.name}].")
+            fail(err)
+
+    threads = [threading.Thread(target=read_source, daemon=True)]
+    process_pools = {}
+    for stage_idx, stage in enumerate(stages):
+        if stage.n_workers < 1:
+            raise ValueError(f"Stage [{stage.name}] must have at least one worker.")
+        if stage.executor not in ("thread", "process"):
+            raise ValueError(f"Unknown executor of stage [{stage.name}]: [{stage.executor}].")
+        if stage.executor == "process":
+            # Each thread of the stage waits for one task at a time in the pool of the stage.
+            process_pools[stage_idx] = ProcessPoolExecutor(max_workers=stage.n_workers)
+        remaining_workers, lock = [stage.n_workers], threading.Lock()
+        threads += [
+            threading.Thread(target=run_stage, args=(stage_idx, remaining_workers, lock), daemon=True)
+            for _ in range(stage.n_workers)
+        ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        while True:
+            item = _get(output_queue, stop_event)
+            if item is _END:
+                break
+            if sink is not None:
+                sink(item)
+    except _PipelineAborted:
+        pass
+    except BaseException as err:
+        fail(err)
+    finally:
+        stop_event.set()
+        for thread in threads:
+            thread.join()
+        for process_pool in process_pools.values():
+            process_pool.shutdown(wait=True)
+    if errors:
+        raise errors[0]
@@ -1,6 +1,3 @@
-from sklearn.model_selection import StratifiedGroupKFold
-
-
 def create_folds(
         sample_ids: list[str],
         label_ids: list[str],
@@ -20,6 +17,8 @@ def create_folds(
         A list of folds, each containing sample ids.
         e.g., [[sample_1, sample_2, ...], [sample_40, sample_41, ...], ...]
     """
+    from sklearn.model_selection import StratifiedGroupKFold
+
     # Note: shuffle=True is recommended to randomize group order
     # before splitting, which helps create more balanced folds.
     sgkf = StratifiedGroupKFold(n_splits=n_folds, shuffle=True, random_state=42)
@@ -1,13 +1,18 @@
 import copy
+import dataclasses
 import io
 import os
 import tarfile
 import posixpath
 from datetime import datetime
+from typing import Iterator
 
 import numpy as np
 
 
+TAR_BLOCK_SIZE = 512
+
+
 def add_file_to_tar(
         name: str,
         tar_file: tarfile.TarFile,
@@ -86,6 +91,130 @@ def iter_tar_members(tar: tarfile.TarFile | str, recursive: bool = False):
             yield member
 
 
+
+@dataclasses.dataclass(frozen=True)
+class RawTarMember:
+    """
+    Location of a member in the bytes of an uncompressed tar archive.
+
+    Attributes:
+        name: Name of the member (after applying GNU long names and pax headers).
+        type: Tar type flag of the member (e.g. `tarfile.REGTYPE`).
+        offset: Offset of the first header block of the member, including its extended headers.
+        data_offset: Offset of the data of the member.
+        size: Size of the data of the member, in bytes.
+    """
+    name: str
+    type: bytes
+    offset: int
+    data_offset: int
+    size: int
+
+    @property
+    def end_offset(self) -> int:
+        """Offset of the end of the member, including the padding of its last data block."""
+        return self.data_offset + _round_up_to_block(self.size)
+
+    def isfile(self) -> bool:
+        return self.type in tarfile.REGULAR_TYPES
+
+
+def _round_up_to_block(size: int) -> int:
+    return -(-size // TAR_BLOCK_SIZE) * TAR_BLOCK_SIZE
+
+
+def _parse_tar_number(field: bytes) -> int:
+    if field[0] & 0x80:
+        # GNU base-256 encoding for large values.
+        return int.from_bytes(bytes([field[0] & 0x7F]) + field[1:], "big")
+    field = field.split(b"\0", 1)[0].strip()
+    return int(field, 8) if field else 0
+
+
+def _parse_tar_string(field: bytes) -> str:
+    return field.split(b"\0", 1)[0].decode("utf-8", errors="surrogateescape")
+
+
+def _parse_pax_headers(data: bytes) -> dict[str, str]:
+    headers = {}
+    position = 0
+    while position < len(data):
+        space = data.index(b" ", position)
+        length = int(data[position:space])
+        key, value = data[space + 1:position + length - 1].split(b"=", 1)
+        headers[key.decode("utf-8")] = value.decode("utf-8", errors="surrogateescape")
+        position += length
+    return headers
+
+
+def iter_raw_tar_members(buffer: bytes | bytearray | memoryview) -> Iterator[RawTarMember]:
+    """
+    Yields the location of each member of an uncompressed tar archive held in memory
+    (e.g. a `bytearray` or a `mmap`), by parsing the header blocks directly.
+
+    Contrary to `tarfile`, the data of the members is never read or copied.
+    GNU long names (`L`) and pax headers (`x`) are applied to the following member,
+    and are included in its `[offset, end_offset)` range.
+
+    Raises:
+        tarfile.ReadError: If a header is invalid or the archive is truncated.
+    """
+    buffer = memoryview(buffer)
+    total_size = len(buffer)
+    position = 0
+    member_offset = None
+    long_name = None
+    pax_headers = {}
+    while position + TAR_BLOCK_SIZE <= total_size:
+        header = bytes(buffer[position:position + TAR_BLOCK_SIZE])
+        if header == bytes(TAR_BLOCK_SIZE):
+            return
+        stored_checksum = _parse_tar_number(header[148:156])
+        if stored_checksum != sum(header[:148]) + 8 * 32 + sum(header[156:]):
+            raise tarfile.ReadError(f"Invalid tar header checksum at offset {position}.")
+        if member_offset is None:
+            member_offset = position
+        member_type = header[156:157]
+        size = _parse_tar_number(header[124:136])
+        data_offset = position + TAR_BLOCK_SIZE
+        if data_offset + size > total_size:
+            raise tarfile.ReadError(f"Truncated tar member at offset {position}.")
+        position = data_offset + _round_up_to_block(size)
+
+        if member_type == tarfile.GNUTYPE_LONGNAME:
+            long_name = _parse_tar_string(bytes(buffer[data_offset:data_offset + size]))
+            continue
+        if member_type == tarfile.XHDTYPE:
+            pax_headers = _parse_pax_headers(bytes(buffer[data_offset:data_offset + size]))
+            continue
+        if member_type == tarfile.XGLTYPE:
+            member_offset = None
+            continue
+
+        name = _parse_tar_string(header[0:100])
+        if header[257:262] == b"ustar":
+            prefix = _parse_tar_string(header[345:500])
+            if prefix:
+                name = f"{prefix}/{name}"
+        if long_name is not None:
+            name = long_name
+        if "path" in pax_headers:
+            name = pax_headers["path"]
+        if "size" in pax_headers:
+            size = int(pax_headers["size"])
+            position = data_offset + _round_up_to_block(size)
+        yield RawTarMember(
+            name=name,
+            type=member_type if member_type != b"\0" else tarfile.REGTYPE,
+            offset=member_offset,
+            data_offset=data_offset,
+            size=size,
+        )
+        member_offset = None
+        long_name = None
+        pax_headers = {}
+
+
 if __name__ == "__main__":
     import io
 
@@ -0,0 +1,220 @@
+import hashlib
+import os
+import tarfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+from tqdm import tqdm
+
+
+def hash_file(filepath: str, algorithm: str = "sha256", chunk_size: int = 8 * 1024**2) -> str:
+    """
+    Computes the checksum of a file, reading it in large chunks into a reused buffer.
+
+    Args:
+        filepath: Path of the file.
+        algorithm: Hash algorithm supported by `hashlib`. Default to sha256.
+        chunk_size: Size of the read chunks, in bytes. Default to 8 MiB.
+
+    Returns:
+        The hexadecimal digest of the file.
+    """
+    digest = hashlib.new(algorithm)
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(filepath, "rb", buffering=0) as f:
+        while n_bytes := f.readinto(buffer):
+            digest.update(view[:n_bytes])
+    return digest.hexdigest()
+
+
+def _run_threaded(func, items: list, n_jobs: int, desc: str, show_progress: bool) -> list:
+    # hashlib and file reads release the GIL, so threads are enough to use multiple cores and disks.
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        return list(tqdm(executor.map(func, items), total=len(items), desc=desc, disable=not show_progress))
+
+
+def write_checksum_manifest(
+    filepaths: Iterable[str],
+    manifest_path: str,
+    root: Optional[str] = None,
+    algorithm: str = "sha256",
+    n_jobs: int = 8,
+    show_progress: bool = False,
+):
+    """
+    Hashes files in parallel and writes a checksum manifest, in the format of `sha256sum`
+    (one `{digest}  {path}` line per file).
+
+    Args:
+        filepaths: Paths of the files.
+        manifest_path: Path of the produced manifest.
+        root: Paths in the manifest are relative to this directory. Default to the manifest directory.
+        algorithm: Hash algorithm supported by `hashlib`. Default to sha256.
+        n_jobs: Number of files hashed at the same time. Default to 8.
+        show_progress: Show a progress bar. Default to False.
+    """
+    root = Path(root if root is not None else Path(manifest_path).parent)
+    filepaths = sorted(str(filepath) for filepath in filepaths)
+    digests = _run_threaded(
+        lambda filepath: hash_file(filepath, algorithm=algorithm),
+        filepaths,
+        n_jobs=n_jobs,
+        desc="Hashing files",
+        show_progress=show_progress,
+    )
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        for filepath, digest in zip(filepaths, digests):
+            f.write(f"{digest}  {Path(os.path.relpath(filepath, root)).as_posix()}\n")
+
+
+def verify_checksum_manifest(
+    manifest_path: str,
+    root: Optional[str] = None,
+    algorithm: str = "sha256",
+    n_jobs: int = 8,
+    show_progress: bool = False,
+) -> list[str]:
+    """
+    Verifies the files listed in a checksum manifest (see `write_checksum_manifest`).
+
+    Returns:
+        The paths of the files that are missing or whose checksum does not match.
+    """
+    root = Path(root if root is not None else Path(manifest_path).parent)
+    entries = []
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                digest, filepath = line.rstrip("\n").split("  ", 1)
+                entries.append((digest, str(root / filepath)))
+
+    def check(entry: tuple[str, str]) -> bool:
+        expected_digest, filepath = entry
+        return os.path.isfile(filepath) and hash_file(filepath, algorithm=algorithm) == expected_digest
+
+    results = _run_threaded(check, entries, n_jobs=n_jobs, desc="Verifying files", show_progress=show_progress)
+    return [filepath for (_, filepath), valid in zip(entries, results) if not valid]
+
+
+def read_npy_header(fileobj, size: int) -> tuple[np.dtype, tuple[int, ...]]:
+    """
+    Reads and validates the header of a `.npy` file without reading its data.
+
+    Args:
+        fileobj: File object positioned at the start of the `.npy` file.
+        size: Total size of the `.npy` file, in bytes.
+
+    Returns:
+        The data type and the shape of the array.
+
+    Raises:
+        ValueError: If the header is invalid or does not match the size of the file.
+    """
+    version = np.lib.format.read_magic(fileobj)
+    match version:
+        case (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(fileobj)
+        case (2, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(fileobj)
+        case _:
+            raise ValueError(f"Unsupported npy format version: {version}.")
+    if dtype.hasobject:
+        raise ValueError("Arrays of objects are not supported.")
+    expected_size = fileobj.tell() + dtype.itemsize * int(np.prod(shape, dtype="int64"))
+    if expected_size != size:
+        raise ValueError(f"Expected {expected_size} bytes for an array {dtype}{shape}, got {size} bytes.")
+    return dtype, shape
+
+
+def read_npz_headers(fileobj, size: int) -> dict[str, tuple[np.dtype, tuple[int, ...]]]:
+    """
+    Reads and validates the central directory of a `.npz` archive and the header of each of its arrays,
+    without decompressing their data.
+
+    Args:
+        fileobj: Seekable file object of the `.npz` archive.
+        size: Total size of the archive, in bytes.
+
+    Returns:
+        The data type and the shape of each array, by name.
+
+    Raises:
+        ValueError: If the archive or the header of an array is invalid.
+    """
+    headers = {}
+    try:
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if info.header_offset + info.compress_size > size:
+                    raise ValueError(f"Truncated array [{info.filename}].")
+                if not info.filename.endswith(".npy"):
+                    raise ValueError(f"Unexpected member [{info.filename}].")
+                with archive.open(info) as f:
+                    headers[info.filename[:-len(".npy")]] = read_npy_header(f, info.file_size)
+    except (zipfile.BadZipFile, EOFError) as err:
+        raise ValueError(f"Invalid zip archive: {err}")
+    return headers
+
+
+def validate_shard(shard_path: str) -> list[str]:
+    """
+    Validates the structure of a tar shard and the header of every `.npy` member, and of every array
+    of the `.npz` members (e.g. `.sparse.npz` and `.q16.npz` encoded poses), without loading the array payloads.
+
+    Returns:
+        A list of error messages. The shard is valid if the list is empty.
+    """
+    errors = []
+    file_size = os.path.getsize(shard_path)
+    is_compressed = not shard_path.endswith(".tar")
+    try:
+        with tarfile.open(shard_path, "r:*") as tar:
+            for member in tar:
+                if not member.isfile():
+                    continue
+                if not is_compressed and member.offset_data + member.size > file_size:
+                    errors.append(f"Truncated member [{member.name}].")
+                    break
+                if member.name.endswith(".npy"):
+                    try:
+                        read_npy_header(tar.extractfile(member), member.size)
+                    except ValueError as err:
+                        errors.append(f"Invalid array [{member.name}]: {err}")
+                elif member.name.endswith(".npz"):
+                    try:
+                        read_npz_headers(tar.extractfile(member), member.size)
+                    except ValueError as err:
+                        errors.append(f"Invalid arrays [{member.name}]: {err}")
+    except (tarfile.TarError, EOFError, OSError) as err:
+        errors.append(f"Invalid tar archive: {err}")
+    return errors
+
+
+def validate_shards(
+    shard_paths: Iterable[str],
+    n_jobs: int = 8,
+    show_progress: bool = False,
+) -> dict[str, list[str]]:
+    """
+    Validates multiple shards in parallel (see `validate_shard`).
+
+    Returns:
+        A mapping from shard path to its error messages, for invalid shards only.
+    """
+    shard_paths = list(shard_paths)
+    results = _run_threaded(validate_shard, shard_paths, n_jobs=n_jobs, desc="Validating shards", show_progress=show_progress)
+    return {shard_path: errors for shard_path, errors in zip(shard_paths, results) if errors}
+
+
+if __name__ == "__main__":
+    root = Path("E:/datasets/sign-language/dgs-corpus")
+    write_checksum_manifest(
+        [path for path in root.rglob("*") if path.is_file() and path.suffix in (".mp4", ".eaf", ".gz")],
+        str(root / "checksums.sha256"),
+        show_progress=True,
+    )
+    print(validate_shards([str(path) for path in root.glob("shards/*/*.tar")], show_progress=True))
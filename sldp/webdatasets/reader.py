@@ -0,0 +1,245 @@
+import ast
+import mmap
+import os
+import posixpath
+import queue
+import random
+import threading
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+
+from sldp.poses.codecs import deserialize_pose, get_pose_codec
+from sldp.utils.tar import RawTarMember, iter_raw_tar_members
+
+
+def get_sample_key(name: str) -> tuple[str, str]:
+    """
+    Returns the sample key and the field of a shard member.
+
+    Supported layouts:
+      - `{key}.pose.{region}.npy`, `{key}.label.idx` (e.g. `build_simple_islr_webdataset`);
+      - `poses/{region}/{key}.npy` (e.g. `convert_open_pose_tar`), mapped to the field `pose.{region}.npy`.
+    """
+    directory, basename = posixpath.split(name)
+    parent_directory, region = posixpath.split(directory)
+    if posixpath.basename(parent_directory) == "poses":
+        key, extension = basename.split(".", 1)
+        return key, f"pose.{region}.{extension}"
+    key, field = basename.split(".", 1)
+    return posixpath.join(directory, key), field
+
+
+def decode_npy(buffer: memoryview, offset: int, size: int) -> np.ndarray:
+    """
+    Decodes a `.npy` file stored at `buffer[offset:offset + size]`
+    as an array view on the buffer (no copy).
+    """
+    if bytes(buffer[offset:offset + 6]) != b"\x93NUMPY":
+        raise ValueError("Invalid npy magic string.")
+    major_version = buffer[offset + 6]
+    length_size = 2 if major_version == 1 else 4
+    header_start = offset + 8 + length_size
+    header_length = int.from_bytes(bytes(buffer[offset + 8:header_start]), "little")
+    header = bytes(buffer[header_start:header_start + header_length])
+    header_dict = ast.literal_eval(header.decode("utf-8" if major_version >= 3 else "latin1"))
+    dtype = np.lib.format.descr_to_dtype(header_dict["descr"])
+    shape = tuple(header_dict["shape"])
+    count = int(np.prod(shape, dtype="int64"))
+    data_offset = header_start + header_length
+    if data_offset - offset + count * dtype.itemsize != size:
+        raise ValueError(f"Invalid npy size for an array {dtype}{shape}.")
+    array = np.frombuffer(buffer, dtype=dtype, count=count, offset=data_offset)
+    return array.reshape(shape, order="F" if header_dict["fortran_order"] else "C")
+
+
+def _decode_field(field: str, buffer: memoryview, member: RawTarMember, densify: bool = True):
+    if field.endswith(".npy"):
+        return decode_npy(buffer, member.data_offset, member.size)
+    data = bytes(buffer[member.data_offset:member.data_offset + member.size])
+    if field.startswith("pose.") and (codec := get_pose_codec(field)) is not None:
+        return deserialize_pose(data, codec, densify=densify)
+    if field.endswith(".idx"):
+        return int(data)
+    if field.endswith(".txt"):
+        return data.decode("utf-8")
+    return data
+
+
+def _add_field(sample: dict, field: str, value):
+    name = field.rsplit(".", 1)[0]
+    if name.startswith("pose."):
+        # The extension of encoded poses may have several parts, e.g. `pose.left_hand.sparse.npz`.
+        sample["poses"][name.split(".")[1]] = value
+    elif name == "label":
+        sample["label_id"] = value
+    else:
+        sample[name] = value
+
+
+def iter_samples_from_buffer(buffer, shard_path: Optional[str] = None, densify: bool = True) -> Iterator[dict]:
+    """
+    Yields the samples of a shard held in memory. Members of a sample must be consecutive.
+
+    Samples are dictionaries with the same structure as the samples of the loaders
+    (`id`, `poses`, `label_id`, ...). Arrays are views on the buffer (read-only if it is memory-mapped).
+    Poses encoded with another codec than `npy` (see `sldp.poses.codecs`) are decoded,
+    and rebuilt as dense arrays if `densify` is True.
+    """
+    buffer = memoryview(buffer)
+    sample = None
+    for member in iter_raw_tar_members(buffer):
+        if not member.isfile():
+            continue
+        key, field = get_sample_key(member.name)
+        if sample is None or sample["id"] != key:
+            if sample is not None:
+                yield sample
+            sample = {"id": key, "poses": {}, "__shard__": shard_path}
+        _add_field(sample, field, _decode_field(field, buffer, member, densify))
+    if sample is not None:
+        yield sample
+
+
+def read_shard_buffer(shard_path: str, use_mmap: bool = False):
+    """
+    Reads a whole shard with one large sequential read (or memory-maps it if `use_mmap` is True).
+    """
+    with open(shard_path, "rb", buffering=0) as f:
+        size = os.fstat(f.fileno()).st_size
+        if use_mmap:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size > 0 else b""
+        buffer = bytearray(size)
+        view = memoryview(buffer)
+        position = 0
+        while position < size:
+            n_bytes = f.readinto(view[position:])
+            if not n_bytes:
+                raise EOFError(f"Unexpected end of file [{shard_path}].")
+            position += n_bytes
+        return buffer
+
+
+def split_shards(
+    shard_paths: list[str],
+    rank: int = 0,
+    world_size: int = 1,
+    worker_id: int = 0,
+    num_workers: int = 1,
+) -> list[str]:
+    """Returns the shards assigned to a dataloader worker of a node."""
+    global_worker_id = rank * num_workers + worker_id
+    return shard_paths[global_worker_id::world_size * num_workers]
+
+
+def _get_distributed_info() -> tuple[int, int, int, int]:
+    rank = int(os.environ.get("RANK", 0))
+    world_size = int(os.environ.get("WORLD_SIZE", 1))
+    worker_id, num_workers = 0, 1
+    try:
+        from torch.utils.data import get_worker_info
+    except ImportError:
+        return rank, world_size, worker_id, num_workers
+    worker_info = get_worker_info()
+    if worker_info is not None:
+        worker_id, num_workers = worker_info.id, worker_info.num_workers
+    return rank, world_size, worker_id, num_workers
+
+
+class ShardReader:
+    """
+    Iterates over the samples of tar shards, with zero-copy decoding of the `.npy` members
+    and background prefetching of the next shards.
+
+    Shards are split across nodes (`RANK`, `WORLD_SIZE` environment variables) and PyTorch
+    dataloader workers, unless the split is given explicitly.
+
+    Example:
+        >>> for sample in ShardReader(shard_paths):
+        ...     sample['poses']['left_hand'], sample['label_id']
+
+    Args:
+        shard_paths: Paths of the shards.
+        prefetch: Number of shards read in advance in a background thread. Default to 2.
+        use_mmap: Memory-map the shards instead of reading them. Default to False.
+        shuffle_shards: Shuffle the order of the shards at each iteration. Default to False.
+        seed: Seed of the shard shuffling. Default to 0.
+        densify: Rebuild dense arrays from sparse poses (see `sldp.poses.sparse`). Default to True.
+        rank, world_size, worker_id, num_workers: Explicit split of the shards. Default to auto-detection.
+    """
+
+    def __init__(
+        self,
+        shard_paths: Iterable[str],
+        prefetch: int = 2,
+        use_mmap: bool = False,
+        shuffle_shards: bool = False,
+        seed: int = 0,
+        densify: bool = True,
+        rank: Optional[int] = None,
+        world_size: Optional[int] = None,
+        worker_id: Optional[int] = None,
+        num_workers: Optional[int] = None,
+    ):
+        self.shard_paths = list(shard_paths)
+        self.prefetch = prefetch
+        self.use_mmap = use_mmap
+        self.shuffle_shards = shuffle_shards
+        self.seed = seed
+        self.densify = densify
+        self.split = (rank, world_size, worker_id, num_workers)
+        self.epoch = 0
+
+    def _get_shard_paths(self) -> list[str]:
+        shard_paths = list(self.shard_paths)
+        if self.shuffle_shards:
+            random.Random(self.seed + self.epoch).shuffle(shard_paths)
+        detected_split = _get_distributed_info()
+        rank, world_size, worker_id, num_workers = (
+            value if value is not None else detected_value
+            for value, detected_value in zip(self.split, detected_split)
+        )
+        return split_shards(shard_paths, rank, world_size, worker_id, num_workers)
+
+    def _iter_shard_buffers(self, shard_paths: list[str]) -> Iterator[tuple[str, object]]:
+        if self.prefetch < 1:
+            for shard_path in shard_paths:
+                yield shard_path, read_shard_buffer(shard_path, self.use_mmap)
+            return
+
+        buffers = queue.Queue(maxsize=self.prefetch)
+        stop_event = threading.Event()
+
+        def put(item) -> bool:
+            while not stop_event.is_set():
+                try:
+                    buffers.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def read_shards():
+            try:
+                for shard_path in shard_paths:
+                    if not put((shard_path, read_shard_buffer(shard_path, self.use_mmap))):
+                        return
+                put(None)
+            except BaseException as err:
+                put(err)
+
+        thread = threading.Thread(target=read_shards, daemon=True)
+        thread.start()
+        try:
+            while (item := buffers.get()) is not None:
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            stop_event.set()
+
+    def __iter__(self) -> Iterator[dict]:
+        shard_paths = self._get_shard_paths()
+        self.epoch += 1
+        for shard_path, buffer in self._iter_shard_buffers(shard_paths):
+            yield from iter_samples_from_buffer(buffer, shard_path, self.densify)
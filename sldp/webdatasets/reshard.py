@@ -0,0 +1,147 @@
+import mmap
+import os
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+from tqdm import tqdm
+
+from sldp.utils.tar import TAR_BLOCK_SIZE, iter_raw_tar_members
+from sldp.webdatasets.reader import get_sample_key
+from sldp.webdatasets.stats import STATS_COLUMNS, ShardStatsWriter, get_stats_path
+
+
+def _iter_sample_spans(buffer) -> Iterator[tuple[str, int, int]]:
+    """
+    Yields `(key, start_offset, end_offset)` for each sample of a shard, where the span covers
+    the header and data blocks of all the (consecutive) members of the sample.
+    """
+    current_key, start_offset, end_offset = None, 0, 0
+    for member in iter_raw_tar_members(buffer):
+        key = get_sample_key(member.name)[0] if member.isfile() else current_key
+        if key != current_key:
+            if current_key is not None:
+                yield current_key, start_offset, end_offset
+            current_key, start_offset = key, member.offset
+        end_offset = member.end_offset
+    if current_key is not None:
+        yield current_key, start_offset, end_offset
+
+
+def _load_stats_rows(shard_path: str) -> Optional[dict[str, dict]]:
+    stats_path = get_stats_path(shard_path)
+    if not os.path.exists(stats_path):
+        return None
+    with np.load(stats_path, allow_pickle=False) as data:
+        columns = {column: data[column].tolist() for column in STATS_COLUMNS}
+    return {
+        sample_id: {column: columns[column][idx] for column in STATS_COLUMNS if column != "id"}
+        for idx, sample_id in enumerate(columns["id"])
+    }
+
+
+class _RawShardWriter:
+    def __init__(self, dest_shard_path_template: str, max_shard_size: Optional[int], max_samples: Optional[int]):
+        self.dest_shard_path_template = dest_shard_path_template
+        self.max_shard_size = max_shard_size
+        self.max_samples = max_samples
+        self.shard_paths = []
+        self.dest_file = None
+        self.size = 0
+        self.n_samples = 0
+        self.stats = None
+
+    def _is_full(self, sample_size: int) -> bool:
+        if self.dest_file is None:
+            return True
+        if self.n_samples == 0:
+            return False
+        if self.max_samples is not None and self.n_samples >= self.max_samples:
+            return True
+        # The two zero blocks closing the archive are included in the shard size.
+        return self.max_shard_size is not None \
+            and self.size + sample_size + 2 * TAR_BLOCK_SIZE > self.max_shard_size
+
+    def _close_shard(self):
+        if self.dest_file is None:
+            return
+        self.dest_file.write(bytes(2 * TAR_BLOCK_SIZE))
+        self.dest_file.close()
+        if self.stats is not None:
+            self.stats.save(get_stats_path(self.shard_paths[-1]))
+        self.dest_file = None
+
+    def write(self, data: memoryview, key: str, stats_row: Optional[dict]):
+        if self._is_full(len(data)):
+            self._close_shard()
+            self.shard_paths.append(self.dest_shard_path_template.format(len(self.shard_paths) + 1))
+            self.dest_file = open(self.shard_paths[-1], "wb")
+            self.size = 0
+            self.n_samples = 0
+            self.stats = ShardStatsWriter()
+        self.dest_file.write(data)
+        self.size += len(data)
+        self.n_samples += 1
+        if stats_row is None:
+            self.stats = None
+        elif self.stats is not None:
+            self.stats.add(key, **stats_row)
+
+    def close(self):
+        self._close_shard()
+
+
+def reshard(
+    source_shard_paths: Iterable[str],
+    dest_shard_path_template: str,
+    max_shard_size: Optional[int] = 256 * 1024**2,
+    max_samples_per_shard: Optional[int] = None,
+    show_progress: bool = False,
+) -> list[str]:
+    """
+    Merges and re-splits tar shards by copying the raw header and data blocks of their members,
+    without decoding or re-serializing anything. All the members of a sample are kept together.
+
+    Statistics sidecars (see `sldp.webdatasets.stats`) are re-split too, for the new shards
+    whose samples all come from shards with a sidecar.
+
+    Args:
+        source_shard_paths: Paths of the source shards (uncompressed tar files).
+        dest_shard_path_template: Template of the paths of the new shards,
+            formatted with the shard number (starting at 1), e.g. `shards/poses_{:0>5}.tar`.
+        max_shard_size: Max size of a new shard, in bytes, unless it contains a single sample.
+            Default to 256 MiB. None for no limit.
+        max_samples_per_shard: Max number of samples in a new shard. Default to None (no limit).
+        show_progress: Show a progress bar. Default to False.
+
+    Returns:
+        The paths of the new shards.
+    """
+    writer = _RawShardWriter(dest_shard_path_template, max_shard_size, max_samples_per_shard)
+    try:
+        for source_shard_path in tqdm(list(source_shard_paths), desc="Resharding", unit=" shards", disable=not show_progress):
+            stats_rows = _load_stats_rows(source_shard_path)
+            with open(source_shard_path, "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    continue
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                    view = memoryview(buffer)
+                    try:
+                        for key, start_offset, end_offset in _iter_sample_spans(view):
+                            stats_row = None if stats_rows is None else stats_rows.get(key)
+                            writer.write(view[start_offset:end_offset], key, stats_row)
+                    finally:
+                        view.release()
+    finally:
+        writer.close()
+    return writer.shard_paths
+
+
+if __name__ == "__main__":
+    import glob
+
+    reshard(
+        sorted(glob.glob("E:/datasets/sign-language/bobsl/chunks/poses_*.tar")),
+        "E:/datasets/sign-language/bobsl/shards_256mb/poses_{:0>5}.tar",
+        max_shard_size=256 * 1024**2,
+        show_progress=True,
+    )
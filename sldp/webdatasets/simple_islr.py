@@ -1,21 +1,58 @@
 import io
 import tarfile
+from typing import Optional
 
+from sldp.poses.codecs import serialize_pose
 from sldp.utils.tar import add_file_to_tar
+from sldp.webdatasets.stats import ShardStatsWriter, compute_frame_stats, get_stats_path
 
 
-def build_simple_islr_webdataset(samples: list[dict], dest_filepath: str):
+def build_simple_islr_webdataset(
+        samples: list[dict],
+        dest_filepath: str,
+        codec: str = "npy",
+        codec_options: Optional[dict] = None,
+):
+    """
+    Builds an ISLR shard, and its statistics sidecar (see `sldp.webdatasets.stats`).
+
+    Args:
+        samples: Samples with an `id`, `poses` and a `label_id`.
+        dest_filepath: Path of the shard.
+        codec: Codec of the poses (see `sldp.poses.codecs.serialize_pose`). Default to npy.
+        codec_options: Options of the codec, e.g. `{"confidence_threshold": 0.1}` for the sparse codec,
+            or `{"frame_size": (1920, 1080)}` for the quantized codec if the poses are in pixels.
+    """
     tar_buffer = io.BytesIO()
     tar = tarfile.open(fileobj=tar_buffer, mode="w")
+    stats = ShardStatsWriter()
     for sample in samples:
         sample_id = sample['id']
+        start_offset = tar_buffer.tell()
         for region, poses in sample['poses'].items():
-            add_file_to_tar(f'{sample_id}.pose.{region}.npy', tar, poses)
+            extension, data = serialize_pose(poses, codec, **(codec_options or {}))
+            add_file_to_tar(f'{sample_id}.pose.{region}.{extension}', tar, data)
         add_file_to_tar(f'{sample_id}.label.idx', tar, str(sample['label_id']).encode('ascii'))
+        n_frames, missing_fraction, multiple_fraction = compute_frame_stats(sample['poses'], sample.get('frame_statuses'))
+        stats.add(
+            sample_id,
+            n_frames=n_frames,
+            missing_fraction=missing_fraction,
+            multiple_fraction=multiple_fraction,
+            n_bytes=tar_buffer.tell() - start_offset,
+            label_id=sample['label_id'],
+            label=sample.get('label', ''),
+        )
+    tar.close()
     with open(dest_filepath, "wb") as file:
         file.write(tar_buffer.getvalue())
-    tar_buffer.seek(0)
-    tar.close()
+    stats.save(get_stats_path(dest_filepath))
+
+
+def build_simple_islr_webdataset_from_wlasl_csv(csv_filepath: str, dest_filepath: str):
+    from sldp.csv.wlasl_format import read_wlasl_format_csv
+
+    build_simple_islr_webdataset(read_wlasl_format_csv(csv_filepath), dest_filepath)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,151 @@
+from typing import Iterable, Optional
+
+import numpy as np
+
+
+STATS_COLUMNS = ("id", "label", "label_id", "n_frames", "missing_fraction", "multiple_fraction", "n_bytes")
+
+
+def get_stats_path(shard_path: str) -> str:
+    """Returns the path of the statistics sidecar of a shard (e.g. `shard.tar` -> `shard.stats.npz`)."""
+    if shard_path.endswith(".tar"):
+        shard_path = shard_path[:-len(".tar")]
+    return f"{shard_path}.stats.npz"
+
+
+def compute_frame_stats(
+    poses: dict[str, np.ndarray],
+    frame_statuses: Optional[list[str]] = None,
+) -> tuple[int, float, float]:
+    """
+    Computes the number of frames and the fraction of missing and multiple-person frames of a sample.
+
+    Args:
+        poses: Poses of the sample, as a mapping from body region to an array of shape (T, L, C).
+        frame_statuses: Status of each frame ("ok", "missing-person", "multiple-people"), as returned by
+            `read_open_pose_tar`. If None, frames where all the landmarks of all regions are NaN are missing.
+
+    Returns:
+        A tuple `(n_frames, missing_fraction, multiple_fraction)`.
+    """
+    if frame_statuses is not None:
+        n_frames = len(frame_statuses)
+        if n_frames == 0:
+            return 0, 0.0, 0.0
+        n_missing = sum(1 for status in frame_statuses if status == "missing-person")
+        n_multiple = sum(1 for status in frame_statuses if status == "multiple-people")
+        return n_frames, n_missing / n_frames, n_multiple / n_frames
+    n_frames = next(iter(poses.values())).shape[0] if poses else 0
+    if n_frames == 0:
+        return 0, 0.0, 0.0
+    missing = np.ones(n_frames, dtype=bool)
+    for region_poses in poses.values():
+        missing &= np.isnan(region_poses.reshape(n_frames, -1)).all(axis=-1)
+    return n_frames, float(missing.mean()), 0.0
+
+
+class ShardStatsWriter:
+    """
+    Accumulates per-sample statistics of a shard, and saves them as a columnar sidecar
+    file (`.stats.npz`) next to the shard.
+    """
+
+    def __init__(self):
+        self.columns = {column: [] for column in STATS_COLUMNS}
+
+    def __len__(self):
+        return len(self.columns["id"])
+
+    def add(
+        self,
+        sample_id: str,
+        n_frames: int,
+        missing_fraction: float,
+        multiple_fraction: float,
+        n_bytes: int,
+        label_id: int = -1,
+        label: str = "",
+    ):
+        row = dict(
+            id=sample_id,
+            label=label,
+            label_id=label_id,
+            n_frames=n_frames,
+            missing_fraction=missing_fraction,
+            multiple_fraction=multiple_fraction,
+            n_bytes=n_bytes,
+        )
+        for column, value in row.items():
+            self.columns[column].append(value)
+
+    def save(self, stats_path: str):
+        np.savez(
+            stats_path,
+            id=np.array(self.columns["id"], dtype=str),
+            label=np.array(self.columns["label"], dtype=str),
+            label_id=np.array(self.columns["label_id"], dtype="int32"),
+            n_frames=np.array(self.columns["n_frames"], dtype="int32"),
+            missing_fraction=np.array(self.columns["missing_fraction"], dtype="float32"),
+            multiple_fraction=np.array(self.columns["multiple_fraction"], dtype="float32"),
+            n_bytes=np.array(self.columns["n_bytes"], dtype="int64"),
+        )
+
+
+def load_shard_stats(shard_paths: Iterable[str]) -> dict[str, np.ndarray]:
+    """
+    Loads and concatenates the statistics sidecars of multiple shards.
+
+    Returns:
+        A mapping from column name to an array with one value per sample.
+        The `shard` column contains the path of the shard of each sample.
+    """
+    tables = []
+    for shard_path in shard_paths:
+        with np.load(get_stats_path(shard_path), allow_pickle=False) as data:
+            table = {column: data[column] for column in STATS_COLUMNS}
+        table["shard"] = np.full(table["id"].shape[0], shard_path)
+        tables.append(table)
+    if not tables:
+        return {column: np.array([]) for column in STATS_COLUMNS + ("shard",)}
+    return {column: np.concatenate([table[column] for table in tables]) for column in tables[0]}
+
+
+def query_samples(
+    shard_paths: Iterable[str],
+    min_frames: Optional[int] = None,
+    max_frames: Optional[int] = None,
+    max_missing_fraction: Optional[float] = None,
+    max_multiple_fraction: Optional[float] = None,
+    label_ids: Optional[Iterable[int]] = None,
+) -> dict[str, np.ndarray]:
+    """
+    Selects samples from the statistics sidecars of shards, without reading the shards themselves.
+
+    Example:
+        All samples with 32 to 128 frames and less than 10% of missing frames:
+        >>> query_samples(shard_paths, min_frames=32, max_frames=128, max_missing_fraction=0.1)['id']
+
+    Args:
+        shard_paths: Paths of the shards.
+        min_frames: Min number of frames (inclusive). Default to None.
+        max_frames: Max number of frames (inclusive). Default to None.
+        max_missing_fraction: Max fraction of missing-person frames (exclusive). Default to None.
+        max_multiple_fraction: Max fraction of multiple-people frames (exclusive). Default to None.
+        label_ids: Allowed label ids. Default to None.
+
+    Returns:
+        The statistics of the selected samples, as a mapping from column name to array.
+    """
+    stats = load_shard_stats(shard_paths)
+    selected = np.ones(stats["id"].shape[0], dtype=bool)
+    if min_frames is not None:
+        selected &= stats["n_frames"] >= min_frames
+    if max_frames is not None:
+        selected &= stats["n_frames"] <= max_frames
+    if max_missing_fraction is not None:
+        selected &= stats["missing_fraction"] < max_missing_fraction
+    if max_multiple_fraction is not None:
+        selected &= stats["multiple_fraction"] < max_multiple_fraction
+    if label_ids is not None:
+        selected &= np.isin(stats["label_id"], list(label_ids))
+    return {column: values[selected] for column, values in stats.items()}